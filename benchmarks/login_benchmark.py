@@ -0,0 +1,74 @@
+"""
+Login latency vs. user count: full Sheet1 scan (old login) vs. the UserIndex lookup.
+
+Runs against the SQLite or local backend in a throwaway directory:
+    python benchmarks/login_benchmark.py [--backend sqlite|local] [--sizes 100,1000,10000]
+(Streamlit's "missing ScriptRunContext" warnings on import are expected in bare mode.)
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+
+def load_app(backend, data_dir):
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ["SQLITE_PATH"] = os.path.join(data_dir, "bench.db")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import timehunt_app
+    timehunt_app.LOCAL_DATA_DIR = data_dir
+    return timehunt_app
+
+
+def scan_login(app, name):
+    """The pre-index login: read every user, normalise every PIN, filter by name."""
+    df = pd.DataFrame(app.get_user_backend().read_all(), columns=app.USER_COLUMNS)
+    df['PIN'] = df['PIN'].astype(str).replace(r'\.0$', '', regex=True).str.zfill(4)
+    hit = df[df['Name'] == name]
+    return None if hit.empty else hit.iloc[0].to_dict()
+
+
+def seed(app, start, stop):
+    users = [{"UserID": str(uuid.uuid4()), "Name": f"user{i}", "XP": i, "PIN": str(i % 10000)} for i in range(start, stop)]
+    app.get_user_backend().append_rows(users)
+    app.get_user_index_backend().append_rows([{"Name": u["Name"], "UserID": u["UserID"]} for u in users])
+
+
+def timed(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "local"])
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = load_app(args.backend, data_dir)
+        print(f"backend={args.backend}  (ms per login, mean of {args.repeats})")
+        print(f"{'users':>8} {'full scan':>12} {'indexed':>10} {'speedup':>9}")
+
+        seeded = 0
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            seed(app, seeded, size)
+            seeded = size
+            target = f"user{size - 1}" # Worst case for a scan: the newest user
+
+            assert scan_login(app, target)["UserID"] == app.find_user_by_name(target)["UserID"]
+            scan_ms = timed(lambda: scan_login(app, target), args.repeats)
+            index_ms = timed(lambda: app.find_user_by_name(target), args.repeats)
+            print(f"{size:>8} {scan_ms:>12.2f} {index_ms:>10.3f} {scan_ms / index_ms:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Builds the size-appropriate media variants (static/media + manifest.json) and
+reports the bytes each page load saves compared with the original files.
+
+    python benchmarks/media_report.py
+(Streamlit's "missing ScriptRunContext" warnings on import are expected in bare mode.)
+The app builds the same variants on startup; this is the offline build step + report.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a client downloads on each page: (source, purpose) pairs from MEDIA_VARIANT_SPECS
+PAGE_LOADS = {
+    "First visit (splash + login)": [("1000592991.png", "icon"), ("1000592991.png", "splash"), ("background_small.jpg", "background")],
+    "AI chat": [("1000592991.png", "icon"), ("1000592991.png", "avatar")],
+    "Focus Zone: Rainfall": [("rain.mp3", "loop")],
+}
+
+
+def fmt(n):
+    return f"{n / 1024:,.1f} KB"
+
+
+def main():
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    import timehunt_app as app
+
+    manifest = app.build_media_variants()
+
+    print(f"{'variant':<42}{'original':>12}{'variant':>12}{'saved':>12}")
+    for source, entry in manifest.items():
+        for purpose, variant in entry["variants"].items():
+            label = f"{source} [{purpose}]"
+            if "file" not in variant:
+                print(f"{label:<42}{fmt(entry['bytes']):>12}{'-':>12}{'-':>12}  skipped: {variant['skipped']}")
+                continue
+            saved = entry["bytes"] - variant["bytes"]
+            print(f"{label:<42}{fmt(entry['bytes']):>12}{fmt(variant['bytes']):>12}{fmt(saved):>12}  ({variant['shown']})")
+
+    print(f"\n{'page load':<42}{'before':>12}{'after':>12}{'saved':>12}")
+    for page, items in PAGE_LOADS.items():
+        before = after = 0
+        for source, purpose in items:
+            entry = manifest.get(source)
+            if not entry:
+                continue
+            variant = entry["variants"].get(purpose, {})
+            before += entry["bytes"]
+            after += variant.get("bytes", entry["bytes"])
+        print(f"{page:<42}{fmt(before):>12}{fmt(after):>12}{fmt(before - after):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Per-image watermark cost: the old per-pixel loop vs. the cached, vectorised apply_watermark.
+
+    python benchmarks/watermark_benchmark.py [--size 1024] [--repeats 20]
+(Streamlit's "missing ScriptRunContext" warnings on import are expected in bare mode.)
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_watermark(image):
+    """apply_watermark as it was: re-open, resize and rewrite alpha pixel by pixel per image."""
+    main_img = image.convert("RGBA")
+    width, height = main_img.size
+    logo = Image.open(os.path.join(ROOT, "watermark.png")).convert("RGBA")
+    target_width = min(100, max(40, int(width * 0.10)))
+    new_logo_height = int(target_width * logo.height / logo.width)
+    logo = logo.resize((target_width, new_logo_height), Image.Resampling.LANCZOS)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning) # getdata(), kept as the old code used it
+        pixels = list(logo.getdata())
+    logo.putdata([(r, g, b, 180) if a > 0 else (r, g, b, a) for r, g, b, a in pixels])
+    main_img.paste(logo, (width - target_width - 20, height - new_logo_height - 20), logo)
+    return main_img.convert("RGB")
+
+
+def timed(fn, image, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(image)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import timehunt_app
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 255, (args.size, args.size, 3), dtype=np.uint8))
+
+    # Same pixels (within rounding) before timing
+    old = np.asarray(legacy_watermark(image), dtype=np.int16)
+    new = np.asarray(timehunt_app.apply_watermark(image), dtype=np.int16)
+    print(f"max pixel difference vs legacy: {np.abs(old - new).max()}")
+
+    legacy_ms = timed(legacy_watermark, image, args.repeats)
+    timehunt_app.apply_watermark(image) # Warm the logo cache
+    cached_ms = timed(timehunt_app.apply_watermark, image, args.repeats)
+
+    print(f"{args.size}x{args.size}, watermark ms per image (mean of {args.repeats}):")
+    print(f"  legacy     {legacy_ms:8.2f}")
+    print(f"  vectorised {cached_ms:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
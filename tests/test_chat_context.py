@@ -0,0 +1,46 @@
+"""
+build_chat_context: turns between the summary and the verbatim window must not drop out.
+
+    python -m pytest -q tests
+(Streamlit's "missing ScriptRunContext" warnings on import are expected in bare mode.)
+"""
+import os
+import sys
+
+os.environ.setdefault("STORAGE_BACKEND", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import timehunt_app as app  # noqa: E402
+
+
+def make_history(n, words=400):
+    # ~500 tokens each, so only the newest few fit AI_HISTORY_TOKEN_BUDGET
+    return [
+        {"role": "user" if i % 2 == 0 else "model", "text": f"MSG{i} " + "word " * words}
+        for i in range(n)
+    ]
+
+
+def test_unsummarised_turns_are_still_sent():
+    history = make_history(12)
+    recent, _ = app.build_chat_context(history)
+    window_start = len(history) - len(recent)
+    assert window_start > 3
+
+    # Summary covers the first few turns; the ones after it (fewer than a batch) are not in it yet
+    upto = window_start - (app.AI_SUMMARY_BATCH - 1)
+    app.get_chat_summaries()._summaries.set("gap-session", {"upto": upto, "text": "SUMMARY"})
+
+    recent, summary = app.build_chat_context(history, "gap-session", [])
+    sent = [m["text"].split()[0] for m in recent]
+    assert summary == "SUMMARY"
+    assert sent == [f"MSG{i}" for i in range(upto, len(history))]
+    assert all(app.estimate_tokens(m["text"]) <= app.AI_GAP_MESSAGE_TOKENS + 1 for m in recent[:window_start - upto])
+
+
+def test_no_gap_without_a_session():
+    history = make_history(12)
+    recent, summary = app.build_chat_context(history)
+    assert summary == ""
+    assert recent[-1]["text"].startswith("MSG11")
+    assert len(recent) < len(history)
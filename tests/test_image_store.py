@@ -0,0 +1,40 @@
+"""
+ImageAssetStore: the local image folder stays under max_bytes, least recently viewed first.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+os.environ.setdefault("STORAGE_BACKEND", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import timehunt_app as app  # noqa: E402
+
+
+def noise(seed):
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 255, (256, 256, 3), dtype=np.uint8))
+
+
+def folder_bytes(root):
+    return sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root))
+
+
+def test_evicts_least_recently_viewed(tmp_path):
+    store = app.ImageAssetStore(root=str(tmp_path), max_bytes=10**9)
+    ids = []
+    for i in range(4):
+        ids.append(store.put(noise(i)))
+        for name in os.listdir(tmp_path):  # Distinct, increasing ages
+            if name.startswith(ids[-1][len(store.PREFIX):]):
+                os.utime(tmp_path / name, (1000 + i, 1000 + i))
+
+    store.path(ids[0])  # Viewed: now the most recent
+    store.max_bytes = int(folder_bytes(tmp_path) / 4 * 2.5)
+    ids.append(store.put(noise(99)))
+
+    assert [bool(store.path(i)) for i in ids] == [True, False, False, False, True]
+    assert folder_bytes(tmp_path) <= store.max_bytes
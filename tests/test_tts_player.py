@@ -0,0 +1,49 @@
+"""
+collect_tts_chunks: the TTS player queues finished chunks in order without
+blocking, and skips a chunk that fails or times out.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+from concurrent.futures import Future
+
+os.environ.setdefault("STORAGE_BACKEND", "local")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import timehunt_app as app  # noqa: E402
+
+
+def done(value=None, error=None):
+    future = Future()
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+def make_job(futures, now=1000.0):
+    return {"key": None, "futures": futures, "parts": [], "waiting_since": now}
+
+
+def test_only_the_ready_prefix_is_queued():
+    pending = Future()
+    job = make_job([done("a.mp3"), pending, done("c.mp3")])
+
+    assert app.collect_tts_chunks(job, now=1001.0) == [("audio", "a.mp3")]
+
+    pending.set_result("b.mp3")
+    assert app.collect_tts_chunks(job, now=1002.0) == [("audio", "a.mp3"), ("audio", "b.mp3"), ("audio", "c.mp3")]
+
+
+def test_failed_and_stalled_chunks_are_skipped():
+    stalled = Future()
+    job = make_job([done(error=RuntimeError("gTTS 429")), stalled, done("c.mp3")])
+
+    parts = app.collect_tts_chunks(job, now=1001.0)
+    assert parts == [("skipped", "gTTS 429")]
+
+    parts = app.collect_tts_chunks(job, now=1001.0 + app.TTS_CHUNK_TIMEOUT + 1)
+    assert [kind for kind, _ in parts] == ["skipped", "skipped", "audio"]
+    assert stalled.cancelled()
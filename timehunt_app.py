@@ -12,6 +12,11 @@ import time
 import base64
 import json 
 import uuid
+import threading
+import atexit
+import bisect
+import hashlib
+from collections import OrderedDict
 import calendar
 from streamlit_mic_recorder import mic_recorder
 from gtts import gTTS
@@ -21,7 +26,7 @@ import numpy as np
 
 def clean_text(value, default_text):
     """Converts nan/float junk to clean string."""
-    if pd.isna(value) or value == "nan" or str(value).lower() == "nan" or value is None:
+    if value is None or pd.isna(value) or str(value).lower() == "nan" or str(value).strip() == "":
         return default_text
     return str(value)
 	
@@ -30,13 +35,12 @@ def clean_text(value, default_text):
 current_dir = os.path.dirname(os.path.abspath(__file__))
 os.chdir(current_dir)
 
-def upload_to_drive(image_b64, filename_prefix="img"):
+def upload_to_drive(image_bytes, filename_prefix="img"):
     """
-    Uploads Base64 image to Google Drive with a specific filename.
+    Uploads JPEG bytes to Google Drive with a specific filename.
     Returns a public direct link.
     """
     import io
-    import base64
     from google.oauth2 import service_account
     from googleapiclient.discovery import build
     from googleapiclient.http import MediaIoBaseUpload
@@ -70,9 +74,8 @@ def upload_to_drive(image_b64, filename_prefix="img"):
             'parents': [folder_id]
         }
         
-        # 4. Decode and Upload
-        img_data = base64.b64decode(image_b64)
-        media = MediaIoBaseUpload(io.BytesIO(img_data), mimetype='image/jpeg')
+        # 4. Upload
+        media = MediaIoBaseUpload(io.BytesIO(image_bytes), mimetype='image/jpeg')
 
         file = service.files().create(
             body=file_metadata,
@@ -156,196 +159,1009 @@ def render_live_clock():
     components.html(clock_html, height=80)
 
 # --- 2. DATA PERSISTENCE (Cloud Sync) ---
-def sync_data():
+# All persistence goes through get_row_backend(), which returns one of the
+# backends below for a worksheet/table. Every backend offers the same calls:
+#   read_rows(user_id), read_key_rows(key), read_all(),
+#   upsert_rows(rows), append_rows(rows), update_fields(key, fields), delete_rows(keys)
+# Rows are plain {column: str} dicts addressed by the table's key columns
+# (e.g. (UserID, TaskID)), so a sync only ships what changed.
+REMINDER_COLUMNS = ["UserID", "TaskID", "Task", "Time", "Status", "Type"]
+REMINDER_KEY = ("UserID", "TaskID")
+USER_COLUMNS = ["UserID", "Name", "XP", "League", "Avatar", "LastActive", "PIN", "MainFocus", "ThemeMode", "ThemeColor", "AIVoice"]
+USER_KEY = ("UserID",)
+FEEDBACK_COLUMNS = ["UserID", "Name", "Timestamp", "Query", "Reply", "Status"]
+FEEDBACK_KEY = ("UserID", "Timestamp")
+USER_INDEX_COLUMNS = ["Name", "UserID"] # Login lookup: Name -> UserID
+USER_INDEX_KEY = ("Name",)
+LOCAL_DATA_DIR = os.path.join(current_dir, ".timehunt_data")
+WRITE_BEHIND_INTERVAL = 2.0    # Seconds a change may wait (and coalesce) before it is written
+WRITE_BEHIND_MAX_PENDING = 25  # Flush immediately once this many users/keys are waiting
+PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", 60)) # Seconds a cached user row is trusted
+GSHEET_INDEX_TTL = 30 # Seconds a located key -> row index is reused for reads (other servers' appends)
+LEADERBOARD_REFRESH = 300 # Seconds before the shared leaderboard re-reads Sheet1 (other servers' writes)
+
+def get_storage_mode():
     """
-    Syncs local Session State data to Google Sheets.
-    Merges Date+Time into a single 'Time' column for compatibility.
+    Picks the persistence backend: 'gsheets', 'sqlite' or 'local'.
+    Set STORAGE_BACKEND (secrets or env) to choose; defaults to gsheets
+    when credentials exist, otherwise the offline JSON stand-in.
     """
+    mode = os.environ.get("STORAGE_BACKEND", "")
     try:
+        mode = st.secrets.get("STORAGE_BACKEND", mode)
+        has_gsheets = "connections" in st.secrets and "gsheets" in st.secrets["connections"]
+    except Exception:
+        has_gsheets = False
+
+    if mode:
+        return str(mode).lower()
+    return "gsheets" if has_gsheets else "local"
+
+class LocalRowBackend:
+    """
+    Offline stand-in for a worksheet.
+    Keeps rows in memory and mirrors them to a JSON Lines file (if a path is
+    given), so the sync and chat log can be exercised without Google credentials.
+    Appends add lines to the file; only upserts/deletes rewrite it.
+    """
+    def __init__(self, columns, key_cols, path=None):
+        self.columns = list(columns)
+        self.key_cols = tuple(key_cols)
+        self.path = path
+        self._lock = threading.Lock()
+        self._rows = []
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._rows = [json.loads(line) for line in f if line.strip()]
+            except (OSError, ValueError):
+                self._rows = []
+
+        # Maintained key -> list position index (no scans on upsert)
+        self._row_index = {self._key(r): i for i, r in enumerate(self._rows)}
+        self._key_rows = None # key -> all positions (keys repeat in append-only tabs); built on first read
+
+    def _key(self, row):
+        return tuple(str(row.get(c, "")) for c in self.key_cols)
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(r) + "\n" for r in self._rows)
+        os.replace(tmp_path, self.path)
+
+    def read_rows(self, user_id):
+        if self.key_cols == ("UserID",):
+            return self.read_key_rows((user_id,))
+        with self._lock:
+            return [dict(r) for r in self._rows if str(r.get("UserID")) == str(user_id)]
+
+    def read_key_rows(self, key):
+        key = tuple(str(k) for k in key)
+        with self._lock:
+            if self._key_rows is None:
+                self._key_rows = {}
+                for i, r in enumerate(self._rows):
+                    self._key_rows.setdefault(self._key(r), []).append(i)
+            return [dict(self._rows[i]) for i in self._key_rows.get(key, [])]
+
+    def read_all(self):
+        with self._lock:
+            return [dict(r) for r in self._rows]
+
+    def update_fields(self, key, fields):
+        key = tuple(str(k) for k in key)
+        with self._lock:
+            pos = self._row_index.get(key)
+            if pos is None:
+                return False
+            self._rows[pos].update({c: str(v) for c, v in fields.items()})
+            self._save()
+            return True
+
+    def upsert_rows(self, rows):
+        with self._lock:
+            for row in rows:
+                clean = {c: str(row.get(c, "")) for c in self.columns}
+                key = self._key(clean)
+                if key in self._row_index:
+                    self._rows[self._row_index[key]] = clean
+                else:
+                    self._row_index[key] = len(self._rows)
+                    if self._key_rows is not None:
+                        self._key_rows.setdefault(key, []).append(len(self._rows))
+                    self._rows.append(clean)
+            self._save()
+
+    def append_rows(self, rows):
+        """Adds rows without reading or rewriting anything already stored."""
+        clean_rows = [{c: str(row.get(c, "")) for c in self.columns} for row in rows]
+        with self._lock:
+            for clean in clean_rows:
+                self._row_index.setdefault(self._key(clean), len(self._rows))
+                if self._key_rows is not None:
+                    self._key_rows.setdefault(self._key(clean), []).append(len(self._rows))
+                self._rows.append(clean)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(r) + "\n" for r in clean_rows)
+
+    def delete_rows(self, keys):
+        targets = {tuple(str(k) for k in key) for key in keys}
+        with self._lock:
+            self._rows = [r for r in self._rows if self._key(r) not in targets]
+            self._row_index = {self._key(r): i for i, r in enumerate(self._rows)}
+            self._key_rows = None
+            self._save()
+
+class GSheetRowBackend:
+    """
+    Row-level access to a single worksheet through gspread.
+    Keeps a key -> sheet row number index, so updates and deletes are
+    targeted writes. Before each write only the key cells of the target
+    rows are re-read; if another writer shifted them the index is rebuilt.
+    """
+    def __init__(self, worksheet_name, columns, key_cols):
+        import gspread
         from streamlit_gsheets import GSheetsConnection
         conn = st.connection("gsheets", type=GSheetsConnection)
-        
+        try:
+            self.ws = conn.client._select_worksheet(worksheet=worksheet_name)
+        except gspread.WorksheetNotFound:
+            # Partition/index tabs are created on first use
+            spreadsheet = conn.client._open_spreadsheet()
+            self.ws = spreadsheet.add_worksheet(title=worksheet_name, rows=1, cols=len(columns))
+        self.columns = list(columns)
+        self.key_cols = tuple(key_cols)
+        self._lock = threading.Lock()
+        self.header = self._ensure_header()
+        self._key_letters = [self._col_letter(self.header.index(c) + 1) for c in self.key_cols]
+        self._row_index = None # Built lazily on first read/write
+        self._located_at = 0
+
+    def _ensure_header(self):
+        """Adds any missing columns (e.g. TaskID on legacy sheets) to row 1."""
+        header = self.ws.row_values(1)
+        missing = [c for c in self.columns if c not in header]
+        if missing:
+            header = header + missing
+            if self.ws.col_count < len(header):
+                self.ws.add_cols(len(header) - self.ws.col_count)
+            self.ws.update(range_name="A1", values=[header])
+        return header
+
+    @staticmethod
+    def _runs(row_nums):
+        """Groups sorted row numbers into contiguous [start, end] blocks."""
+        blocks = []
+        for r in row_nums:
+            if blocks and r == blocks[-1][1] + 1:
+                blocks[-1][1] = r
+            else:
+                blocks.append([r, r])
+        return blocks
+
+    @staticmethod
+    def _col_letter(col_num):
+        from gspread.utils import rowcol_to_a1
+        return re.sub(r"\d", "", rowcol_to_a1(1, col_num))
+
+    def _key(self, row):
+        return tuple(str(row.get(c, "")) for c in self.key_cols)
+
+    def _locate(self):
+        """Maps key -> list of sheet row numbers, reading only the key columns."""
+        columns = self.ws.batch_get([f"{l}2:{l}" for l in self._key_letters])
+        height = max((len(c) for c in columns), default=0)
+
+        positions = {}
+        for offset in range(height):
+            key = tuple(
+                str(col[offset][0]) if offset < len(col) and col[offset] else ""
+                for col in columns
+            )
+            positions.setdefault(key, []).append(offset + 2)
+        return positions
+
+    def _relocate(self):
+        self._row_index = self._locate()
+        self._located_at = time.time()
+        return self._row_index
+
+    def _index_for(self, keys):
+        """
+        Returns the row index, checking that `keys` still sit at their indexed rows.
+        One small batch read of key cells instead of a column scan.
+        """
+        if self._row_index is None:
+            self._relocate()
+            return self._row_index
+
+        checks = [(key, r) for key in keys for r in self._row_index.get(key, [])]
+        if checks:
+            cells = self.ws.batch_get([f"{l}{r}" for _, r in checks for l in self._key_letters])
+            width = len(self._key_letters)
+            for i, (key, _) in enumerate(checks):
+                found = tuple(
+                    str(c[0][0]) if c and c[0] else ""
+                    for c in cells[i * width:(i + 1) * width]
+                )
+                if found != key:
+                    self._relocate()
+                    break
+        return self._row_index
+
+    def _fetch_rows(self, row_nums):
+        """Downloads only the given sheet rows (one range per contiguous block)."""
+        if not row_nums:
+            return []
+        last_col = self._col_letter(len(self.header))
+        blocks = self._runs(sorted(set(row_nums)))
+        data = self.ws.batch_get([f"A{s}:{last_col}{e}" for s, e in blocks])
+
+        rows = []
+        for block in data:
+            for values in block:
+                rows.append({c: str(values[i]) if i < len(values) else "" for i, c in enumerate(self.header)})
+        return rows
+
+    def read_rows(self, user_id):
+        """Reads one user's rows: key columns to find them, then just those rows."""
+        if self.key_cols == ("UserID",):
+            return self.read_key_rows((user_id,)) # One row per user (Sheet1): use the cached index
+        with self._lock:
+            self._relocate()
+            nums = [n for key, ns in self._row_index.items() if key[0] == str(user_id) for n in ns]
+            return self._fetch_rows(nums)
+
+    def read_key_rows(self, key):
+        """
+        Rows for one key. A recent index (GSHEET_INDEX_TTL) is reused after checking
+        just this key's cells, so a hit costs two tiny reads instead of downloading
+        the key columns; a miss re-reads them in case another server added the key.
+        """
+        key = tuple(str(k) for k in key)
+        with self._lock:
+            if self._row_index is None or time.time() - self._located_at > GSHEET_INDEX_TTL:
+                self._relocate()
+            else:
+                located_at = self._located_at
+                self._index_for([key])
+                if not self._row_index.get(key) and self._located_at == located_at:
+                    self._relocate()
+            return self._fetch_rows(self._row_index.get(key, []))
+
+    def read_all(self):
+        values = self.ws.get_all_values()
+        return [
+            {c: str(row[i]) if i < len(row) else "" for i, c in enumerate(self.header)}
+            for row in values[1:]
+        ]
+
+    def update_fields(self, key, fields):
+        """Writes only the given cells of one keyed row. False if the row is missing."""
+        key = tuple(str(k) for k in key)
+        with self._lock:
+            hits = self._index_for([key]).get(key)
+            if not hits:
+                # Might have been added by another server since the index was built
+                self._relocate()
+                hits = self._row_index.get(key)
+            if not hits:
+                return False
+
+            self.ws.batch_update([
+                {"range": f"{self._col_letter(self.header.index(c) + 1)}{hits[0]}", "values": [[str(v)]]}
+                for c, v in fields.items()
+            ], value_input_option="RAW")
+            return True
+
+    def upsert_rows(self, rows):
+        last_col = self._col_letter(len(self.header))
+        with self._lock:
+            index = self._index_for([self._key(r) for r in rows])
+            updates, appends, appended_keys = [], [], []
+            for row in rows:
+                values = [str(row.get(c, "")) for c in self.header]
+                hits = index.get(self._key(row))
+                if hits:
+                    updates.append({"range": f"A{hits[0]}:{last_col}{hits[0]}", "values": [values]})
+                else:
+                    appends.append(values)
+                    appended_keys.append(self._key(row))
+
+            if updates:
+                self.ws.batch_update(updates, value_input_option="RAW")
+            if appends:
+                self._append_values(appends, appended_keys)
+
+    def _append_values(self, values, keys):
+        """Single append call; records where the new rows landed if the index is built."""
+        resp = self.ws.append_rows(values, value_input_option="RAW")
+        if self._row_index is None:
+            return
+
+        # e.g. "Reminders!A12:F13" -> new rows start at 12
+        match = re.search(r"![A-Z]+(\d+)", str((resp or {}).get("updates", {}).get("updatedRange", "")))
+        if match:
+            first = int(match.group(1))
+            for offset, key in enumerate(keys):
+                self._row_index.setdefault(key, []).append(first + offset)
+        else:
+            self._row_index = None
+
+    def append_rows(self, rows):
+        """Batched append of N rows in one API call, with no read of existing data."""
+        with self._lock:
+            self._append_values(
+                [[str(row.get(c, "")) for c in self.header] for row in rows],
+                [self._key(row) for row in rows]
+            )
+
+    def delete_rows(self, keys):
+        keys = [tuple(str(k) for k in key) for key in keys]
+        with self._lock:
+            index = self._index_for(keys)
+            doomed = sorted({r for key in keys for r in index.get(key, [])})
+
+            # Delete bottom-up in contiguous blocks so earlier row numbers stay valid
+            blocks = self._runs(doomed)
+            for start, end in reversed(blocks):
+                self.ws.delete_rows(start, end)
+
+            # Shift the index instead of re-reading the sheet
+            for key in keys:
+                index.pop(key, None)
+            for key, nums in index.items():
+                index[key] = [n - sum(e - s + 1 for s, e in blocks if e < n) for n in nums]
+
+class SQLiteRowBackend:
+    """
+    Self-hosting backend: one SQLite table per worksheet in a shared WAL-mode
+    database file, indexed on the key columns (UserID / SessionID / TaskID).
+    No API quotas and no whole-sheet semantics.
+    """
+    def __init__(self, table, columns, key_cols, path):
+        import sqlite3
+        self.table = table
+        self.columns = list(columns)
+        self.key_cols = tuple(key_cols)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+
+        col_defs = ", ".join(f'"{c}" TEXT NOT NULL DEFAULT \'\'' for c in self.columns)
+        self._db.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (_id INTEGER PRIMARY KEY AUTOINCREMENT, {col_defs})')
+
+        # Schema drift: add columns introduced after the table was created
+        existing = {r["name"] for r in self._db.execute(f'PRAGMA table_info("{table}")')}
+        for c in self.columns:
+            if c not in existing:
+                self._db.execute(f'ALTER TABLE "{table}" ADD COLUMN "{c}" TEXT NOT NULL DEFAULT \'\'')
+
+        key_sql = ", ".join(f'"{c}"' for c in self.key_cols)
+        self._db.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_key" ON "{table}" ({key_sql})')
+        self._where = " AND ".join(f'"{c}" = ?' for c in self.key_cols)
+
+    def _select(self, where="", params=()):
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        sql = f'SELECT {cols} FROM "{self.table}"' + (f" WHERE {where}" if where else "") + " ORDER BY _id"
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, params)]
+
+    def read_rows(self, user_id):
+        return self._select('"UserID" = ?', (str(user_id),))
+
+    def read_key_rows(self, key):
+        return self._select(self._where, tuple(str(k) for k in key))
+
+    def read_all(self):
+        return self._select()
+
+    def _insert(self, rows):
+        cols = ", ".join(f'"{c}"' for c in self.columns)
+        marks = ", ".join("?" for _ in self.columns)
+        self._db.executemany(
+            f'INSERT INTO "{self.table}" ({cols}) VALUES ({marks})',
+            [tuple(str(row.get(c, "")) for c in self.columns) for row in rows]
+        )
+
+    def upsert_rows(self, rows):
+        assignments = ", ".join(f'"{c}" = ?' for c in self.columns)
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            for row in rows:
+                values = tuple(str(row.get(c, "")) for c in self.columns)
+                key = tuple(str(row.get(c, "")) for c in self.key_cols)
+                cur = self._db.execute(f'UPDATE "{self.table}" SET {assignments} WHERE {self._where}', values + key)
+                if cur.rowcount == 0:
+                    self._insert([row])
+
+    def append_rows(self, rows):
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._insert(rows)
+
+    def update_fields(self, key, fields):
+        assignments = ", ".join(f'"{c}" = ?' for c in fields)
+        params = tuple(str(v) for v in fields.values()) + tuple(str(k) for k in key)
+        with self._lock:
+            cur = self._db.execute(f'UPDATE "{self.table}" SET {assignments} WHERE {self._where}', params)
+        return cur.rowcount > 0
+
+    def delete_rows(self, keys):
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                f'DELETE FROM "{self.table}" WHERE {self._where}',
+                [tuple(str(k) for k in key) for key in keys]
+            )
+
+@st.cache_resource(show_spinner=False)
+def get_row_backend(worksheet, columns, key_cols):
+    """One shared backend per worksheet for the whole server process."""
+    mode = get_storage_mode()
+    if mode == "gsheets":
+        return GSheetRowBackend(worksheet, columns, key_cols)
+    if mode == "sqlite":
+        db_path = os.environ.get("SQLITE_PATH", os.path.join(LOCAL_DATA_DIR, "timehunt.db"))
+        return SQLiteRowBackend(worksheet, columns, key_cols, path=db_path)
+    return LocalRowBackend(columns, key_cols, path=os.path.join(LOCAL_DATA_DIR, f"{worksheet}.jsonl"))
+
+def get_user_backend():
+    return get_row_backend("Sheet1", tuple(USER_COLUMNS), USER_KEY)
+
+def get_feedback_backend():
+    return get_row_backend("Feedbacks", tuple(FEEDBACK_COLUMNS), FEEDBACK_KEY)
+
+def get_user_index_backend():
+    return get_row_backend("UserIndex", tuple(USER_INDEX_COLUMNS), USER_INDEX_KEY)
+
+@st.cache_resource(show_spinner=False)
+def ensure_user_index():
+    """
+    Backfills the UserIndex tab from Sheet1 the first time a server sees it empty
+    (i.e. right after upgrading). Signups keep it current from then on.
+    """
+    index = get_user_index_backend()
+    if not index.read_all():
+        first_ids = {}
+        for row in get_user_backend().read_all():
+            name = str(row.get("Name", "")).strip()
+            if name and name not in first_ids: # Old login matched the first row
+                first_ids[name] = row.get("UserID", "")
+        if first_ids:
+            index.append_rows([{"Name": n, "UserID": u} for n, u in first_ids.items()])
+    return True
+
+def find_user_by_name(name):
+    """
+    Login lookup: Name -> UserID through the index, then only that user's Sheet1 row.
+    Returns the row dict (PIN normalised to 4 digits) or None.
+    """
+    ensure_user_index()
+    name = str(name or "").strip() # Index names are stored stripped (see ensure_user_index)
+    if not name:
+        return None
+    hits = get_user_index_backend().read_key_rows((name,))
+    if not hits:
+        return None
+
+    uid = hits[0]["UserID"]
+    rows = get_user_backend().read_rows(uid)
+    if not rows:
+        return None
+
+    row = rows[0]
+    get_profile_cache().set(uid, row)
+    row = dict(row)
+    row["PIN"] = re.sub(r"\.0$", "", str(row.get("PIN", "")).strip()).zfill(4)
+    return row
+
+class TTLCache:
+    """Small thread-safe key -> value cache with per-entry expiry and LRU eviction."""
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self._data.pop(key, None)
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            while len(self._data) >= self.max_entries:
+                # Evict the least recently used entry
+                self._data.popitem(last=False)
+            self._data[key] = (time.time(), value)
+
+    def update(self, key, fields):
+        """Merges fields into a cached dict value (write-through); no-op if not cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data[key] = (entry[0], {**entry[1], **fields})
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+@st.cache_resource(show_spinner=False)
+def get_profile_cache():
+    """Per-user Sheet1 rows shared by all sessions, so Home reruns skip the fetch."""
+    return TTLCache(ttl=PROFILE_CACHE_TTL)
+
+def find_task_position(list_key, task_id):
+    """
+    O(1) lookup of a task/reminder by ID in Session State.
+    Returns its list position (or None). The id -> position map is
+    rebuilt only when it is found to be stale.
+    """
+    items = st.session_state.get(list_key, [])
+    positions = st.session_state.setdefault('task_positions', {})
+    pos = positions.get(list_key, {}).get(task_id)
+
+    if pos is None or pos >= len(items) or items[pos].get('id') != task_id:
+        positions[list_key] = {item.get('id'): i for i, item in enumerate(items)}
+        pos = positions[list_key].get(task_id)
+    return pos
+
+def build_reminder_rows(uid):
+    """
+    Flattens Session State reminders & schedule into sheet rows.
+    Merges Date+Time into a single 'Time' column for compatibility.
+    """
+    rows = []
+
+    # 1. Alarms (Reminders)
+    for reminder in st.session_state.get('reminders', []):
+        reminder.setdefault('id', str(uuid.uuid4()))
+        rows.append({
+            "UserID": str(uid),
+            "TaskID": reminder['id'],
+            "Task": str(reminder['task']),
+            "Time": str(reminder['time']),
+            "Status": "Done" if reminder.get('notified') else "Pending",
+            "Type": "Alarm"
+        })
+
+    # 2. Schedule & Calendar Tasks
+    for schedule_item in st.session_state.get('timetable_slots', []):
+        schedule_item.setdefault('id', str(uuid.uuid4()))
+        # Default to today if Date is missing
+        date_val = schedule_item.get('Date', datetime.date.today().strftime("%Y-%m-%d"))
+
+        rows.append({
+            "UserID": str(uid),
+            "TaskID": schedule_item['id'],
+            "Task": str(schedule_item['Activity']),
+            "Time": f"{date_val} {schedule_item['Time']}", # e.g. "2025-10-27 14:00"
+            "Status": "Done" if schedule_item['Done'] else "Pending",
+            "Type": f"Schedule-{schedule_item['Category']}"
+        })
+    return rows
+
+def diff_rows(previous, current):
+    """
+    Compares two {key: row} snapshots.
+    Returns (rows to upsert, keys to delete).
+    """
+    upserts = [row for key, row in current.items() if previous.get(key) != row]
+    deletes = [key for key in previous if key not in current]
+    return upserts, deletes
+
+class WriteBehindQueue:
+    """
+    Background writer for cloud syncs, so button clicks never wait on the network.
+    Pending changes are coalesced per key (e.g. one Reminders job per user),
+    flushed `interval` seconds after they are queued (or at once when
+    `max_pending` keys are waiting), and retried with exponential backoff.
+    """
+    def __init__(self, interval=2.0, max_pending=25, max_backoff=60.0):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._failures = {}   # user_id -> writes that completed but did not apply
+        self._jobs = {}       # key -> job waiting to be written
+        self._in_flight = {}  # key -> job currently being written
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="timehunt-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, key, writer, target, baseline=None, merge=False):
+        """
+        Queues writer(baseline, target). If `key` is already waiting the newest
+        target wins (or is merged into it for dict targets with merge=True),
+        while the oldest baseline is kept so nothing in between is lost.
+        """
+        with self._cond:
+            job = self._jobs.get(key)
+            if job is None:
+                self._jobs[key] = {
+                    "writer": writer, "baseline": baseline, "target": target, "merge": merge,
+                    "attempts": 0, "due": time.time() + self.interval
+                }
+            else:
+                job["writer"] = writer
+                job["target"] = {**job["target"], **target} if merge else target
+
+            # Size threshold: don't wait for the timer (jobs in backoff keep their delay)
+            if len(self._jobs) >= self.max_pending:
+                now = time.time()
+                for j in self._jobs.values():
+                    if j["attempts"] == 0:
+                        j["due"] = min(j["due"], now)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    due = [j["due"] for j in self._jobs.values()]
+                    if due and min(due) <= now:
+                        break
+                    self._cond.wait(timeout=(min(due) - now) if due else None)
+            self.flush(only_due=True)
+
+    def flush(self, only_due=False):
+        """Writes pending jobs. Called by the worker, and on exit for everything left."""
+        with self._flush_lock:
+            with self._cond:
+                now = time.time()
+                ready = [k for k, j in self._jobs.items() if not only_due or j["due"] <= now]
+                batch = {k: self._jobs.pop(k) for k in ready}
+                self._in_flight.update(batch)
+
+            for key, job in batch.items():
+                try:
+                    job["writer"](job["baseline"], job["target"])
+                    failed = False
+                except Exception as e:
+                    job["error"] = f"{e}" # Kept on the job, so only its user sees "retrying"
+                    print(f"Write-behind Error ({key}): {e}")
+                    failed = True
+
+                with self._cond:
+                    self._in_flight.pop(key, None)
+                    if failed:
+                        self._requeue(key, job)
+
+    def _requeue(self, key, job):
+        """Puts a failed job back with backoff, folding in anything queued meanwhile."""
+        job["attempts"] += 1
+        job["due"] = time.time() + min(self.max_backoff, self.interval * (2 ** job["attempts"]))
+        newer = self._jobs.get(key)
+        if newer is not None:
+            job["writer"] = newer["writer"]
+            job["target"] = {**job["target"], **newer["target"]} if job["merge"] else newer["target"]
+        self._jobs[key] = job
+        self._cond.notify()
+
+    def pending_count(self, user_id):
+        """Number of queued/in-flight writes for one user (for the sidebar badge)."""
+        with self._cond:
+            keys = set(self._jobs) | set(self._in_flight)
+        return len([k for k in keys if k[1] == str(user_id)])
+
+    def last_error(self, user_id):
+        """Error of one of this user's writes waiting for a retry, or None."""
+        with self._cond:
+            for key, job in self._jobs.items():
+                if key[1] == str(user_id) and job.get("error"):
+                    return job["error"]
+        return None
+
+    def cancel(self, key):
+        """Drops a job that hasn't started yet (e.g. its row was just deleted)."""
+        with self._cond:
+            self._jobs.pop(key, None)
+
+    def record_failure(self, user_id, message):
+        """Called by a writer whose write went through but changed nothing (e.g. row missing)."""
+        print(f"Write-behind Warning ({user_id}): {message}")
+        with self._cond:
+            self._failures.setdefault(str(user_id), []).append(message)
+
+    def take_failures(self, user_id):
+        """Returns and clears the failed writes recorded for one user."""
+        with self._cond:
+            return self._failures.pop(str(user_id), [])
+
+    def pending_target(self, key):
+        """Latest not-yet-confirmed value for `key` (lets reads overlay unsaved edits)."""
+        with self._cond:
+            job = self._jobs.get(key) or self._in_flight.get(key)
+            if job is None:
+                return None
+            target = job["target"]
+            return dict(target) if isinstance(target, dict) else target
+
+@st.cache_resource(show_spinner=False)
+def get_write_queue():
+    """Process-wide write-behind queue (one worker thread per server)."""
+    return WriteBehindQueue(interval=WRITE_BEHIND_INTERVAL, max_pending=WRITE_BEHIND_MAX_PENDING)
+
+def flush_pending_writes():
+    """Blocks until everything queued has been attempted (exit / logout hook)."""
+    get_write_queue().flush()
+
+def push_row_delta(backend, previous, current):
+    """Applies the difference between two {key: row} snapshots to a backend."""
+    upserts, deletes = diff_rows(previous, current)
+    if deletes:
+        backend.delete_rows(deletes)
+    if upserts:
+        backend.upsert_rows(upserts)
+
+def sync_data():
+    """
+    Syncs local Session State data to the Reminders sheet.
+    Only rows that changed since the last sync are written or deleted,
+    and the write happens in the background (see WriteBehindQueue).
+    """
+    try:
         # Safety Check: Ensure User ID exists
         uid = st.session_state.get('user_id')
         if not uid: return
 
-        # 1. Read existing cloud data (Handle empty sheet case)
-        try:
-            df_cloud = conn.read(worksheet="Reminders", ttl=0)
-            if not df_cloud.empty and "UserID" in df_cloud.columns:
-                # Keep other users' data, remove current user's old data
-                df_others = df_cloud[df_cloud["UserID"] != str(uid)]
-            else:
-                df_others = pd.DataFrame(columns=["UserID", "Task", "Time", "Status", "Type"])
-        except Exception:
-            # If sheet is missing or read fails, start fresh
-            df_others = pd.DataFrame(columns=["UserID", "Task", "Time", "Status", "Type"])
+        backend = get_row_backend("Reminders", tuple(REMINDER_COLUMNS), REMINDER_KEY)
 
-        new_rows = []
-        
-        # 2. Add Alarms (Reminders)
-        # Use .get() to avoid errors if key is missing
-        for reminder in st.session_state.get('reminders', []):
-            new_rows.append({
-                "UserID": str(uid), 
-                "Task": str(reminder['task']), 
-                "Time": str(reminder['time']), 
-                "Status": "Done" if reminder.get('notified') else "Pending", 
-                "Type": "Alarm"
-            })
-            
-        # 3. Add Schedule & Calendar Tasks
-        for schedule_item in st.session_state.get('timetable_slots', []):
-             # Default to today if Date is missing
-             date_val = schedule_item.get('Date', datetime.date.today().strftime("%Y-%m-%d"))
-             
-             # Combine for sorting: "2025-10-27 14:00"
-             combined_time = f"{date_val} {schedule_item['Time']}"
-             
-             new_rows.append({
-                "UserID": str(uid), 
-                "Task": str(schedule_item['Activity']), 
-                "Time": combined_time, 
-                "Status": "Done" if schedule_item['Done'] else "Pending", 
-                "Type": f"Schedule-{schedule_item['Category']}"
-            })
+        current = {}
+        for row in build_reminder_rows(uid):
+            current[tuple(row[c] for c in REMINDER_KEY)] = row
+        # Only diff against this user's baseline (guards against a login switch)
+        previous = {
+            k: v for k, v in st.session_state.get('synced_reminder_rows', {}).items()
+            if k[0] == str(uid)
+        }
 
-        # 4. Save back to Cloud
-        if new_rows:
-            df_my_data = pd.DataFrame(new_rows)
-            df_final = pd.concat([df_others, df_my_data], ignore_index=True)
-        else:
-            df_final = df_others
+        if current != previous:
+            get_write_queue().submit(
+                ("Reminders", str(uid)),
+                lambda prev, cur: push_row_delta(backend, prev, cur),
+                current, baseline=previous
+            )
+        st.session_state['synced_reminder_rows'] = current
 
-        # Ensure all data is string format to prevent Schema errors
-        df_final = df_final[["UserID", "Task", "Time", "Status", "Type"]].astype(str)
-        conn.clear(worksheet="Reminders")
-        conn.update(worksheet="Reminders", data=df_final)
-        
     except Exception as e:
         # Show a warning icon instead of crashing
         st.toast(f"Sync Issue: {e}", icon="⚠️")
 
+def render_sync_status():
+    """Sidebar badge: how many of this user's changes are still waiting to be saved."""
+    try:
+        queue = get_write_queue()
+        pending = queue.pending_count(st.session_state.get('user_id'))
+        failures = queue.take_failures(st.session_state.get('user_id'))
+    except Exception:
+        return
+
+    for message in failures:
+        st.warning(f"⚠️ {message}")
+
+    if pending and queue.last_error(st.session_state.get('user_id')):
+        st.caption(f"⚠️ {pending} change(s) waiting to sync — retrying")
+    elif pending:
+        st.caption(f"☁️ Saving {pending} change(s)...")
+    else:
+        st.caption("☁️ All changes saved")
+
 # --- USER GENERAL SETTING'S FUNCTION ---
 def update_user_setting(column_name, new_value):
+    """
+    Queues a write of one Sheet1 cell for the current user.
+    Returns True once the change is queued, not saved: a write that finds no
+    row for the user is reported by render_sync_status on a later render.
+    """
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        
-        # 1. Read & Force String Types (Crucial Fix)
-        df = conn.read(worksheet="Sheet1", ttl=0)
-        df = df.astype(str) 
-        
         uid = str(st.session_state.get('user_id'))
         
-        # 2. Check if Column Exists
-        if column_name not in df.columns:
+        # 1. Check if Column Exists
+        if column_name not in USER_COLUMNS:
             st.error(f"⚠️ Column '{column_name}' missing in GSheet!")
             return False
 
-        # 3. Find & Update
-        mask = df["UserID"] == uid
-        if mask.any():
-            df.loc[mask, column_name] = str(new_value)
-            conn.update(worksheet="Sheet1", data=df)
-            return True
-        else:
-            st.warning(f"User ID {uid} not found in database.")
+        # 2. Queue a write of just this user's cell (coalesced with other setting changes)
+        backend = get_user_backend()
+        queue = get_write_queue()
+        profile_cache = get_profile_cache()
+
+        def write_fields(_, fields):
+            if not backend.update_fields((uid,), fields):
+                queue.record_failure(uid, f"User ID not found; {', '.join(fields)} not saved.")
+            # Only once the write has landed: a refresh in between may have cached the old row
+            profile_cache.invalidate(uid)
+
+        queue.submit(("Sheet1", uid), write_fields, {column_name: str(new_value)}, merge=True)
+        profile_cache.update(uid, {column_name: str(new_value)})
+        return True
             
     except Exception as e:
         st.error(f"Save Error: {e}")
     return False
 
 # --- 3. WEATHER UTILITY ---
-def get_real_time_weather(city="Jaipur"):
+WEATHER_TTL = 600         # Current conditions change slowly; one fetch per city per 10 min
+WEATHER_RETRY_AFTER = 60  # Back-off after a failed fetch (open-meteo down / offline)
+WEATHER_WAIT = 0.5        # Max seconds Home waits for a cold fetch before rendering a placeholder
+
+class WeatherService:
     """
-    Fetches real-time weather using standard Python libraries.
-    Returns a clean formatted string for the dashboard.
+    Process-wide open-meteo client shared by every session.
+    - Weather is cached per city for WEATHER_TTL; geocodes are cached for good.
+    - Concurrent requests for the same city share one in-flight fetch.
+    - Fetches run on a small thread pool, so callers never block on the network
+      for more than `wait` seconds (stale values are served while refreshing).
     """
-    import json
-    from urllib.request import urlopen, Request
-
-    # Default fallback values
-    fallback_temp = "--"
-    fallback_desc = f"{city} (Offline)"
-
-    try:
-        # A. Default Coordinates (Jaipur)
-        lat, lon = 26.9124, 75.7873 
-        
-        # B. If city is not default, try to geocode it
-        if city.lower() != "jaipur":
-            try:
-                # User Agent required to prevent API blocking
-                req = Request(
-                    f"https://geocoding-api.open-meteo.com/v1/search?name={city}&count=1&language=en&format=json",
-                    headers={'User-Agent': 'Mozilla/5.0'}
-                )
-                with urlopen(req, timeout=3) as response:
-                    geo_data = json.loads(response.read().decode())
-                
-                if "results" in geo_data:
-                    lat = geo_data["results"][0]["latitude"]
-                    lon = geo_data["results"][0]["longitude"]
-            except Exception:
-                # If geocoding fails, we proceed with default or previous coordinates
-                pass
+    DEFAULT_COORDS = {"jaipur": (26.9124, 75.7873)}
+
+    def __init__(self, ttl=WEATHER_TTL, retry_after=WEATHER_RETRY_AFTER):
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather")
+        self._lock = threading.Lock()
+        self._fresh = TTLCache(ttl=ttl)
+        self._last = {}       # city -> last good (temp, desc), served while stale
+        self._geo = dict(self.DEFAULT_COORDS)
+        self._inflight = {}   # city -> Future
+        self._failed_at = {}  # city -> time of last failed fetch
+        self.retry_after = retry_after
+
+    @staticmethod
+    def _get_json(url):
+        from urllib.request import urlopen, Request
+        # User Agent required to prevent API blocking
+        req = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+        with urlopen(req, timeout=3) as response:
+            return json.loads(response.read().decode())
+
+    def _coords(self, city):
+        key = city.lower()
+        if key in self._geo:
+            return self._geo[key]
+        try:
+            from urllib.parse import quote
+            geo_data = self._get_json(
+                f"https://geocoding-api.open-meteo.com/v1/search?name={quote(city)}&count=1&language=en&format=json"
+            )
+            if geo_data.get("results"):
+                coords = (geo_data["results"][0]["latitude"], geo_data["results"][0]["longitude"])
+                self._geo[key] = coords
+                return coords
+        except Exception:
+            # If geocoding fails, proceed with default coordinates (retried next time)
+            pass
+        return self.DEFAULT_COORDS["jaipur"]
 
-        # C. Fetch Weather Data
-        req_weather = Request(
-            f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true",
-            headers={'User-Agent': 'Mozilla/5.0'}
-        )
-        
-        with urlopen(req_weather, timeout=3) as response:
-            data = json.loads(response.read().decode())
-        
-        if "current_weather" in data:
+    def _fetch(self, city):
+        key = city.lower()
+        try:
+            lat, lon = self._coords(city)
+            data = self._get_json(
+                f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true"
+            )
             temp = data["current_weather"]["temperature"]
             code = data["current_weather"]["weathercode"]
-            
+
             # Simple Weather Code Mapping
             desc = "Clear Sky"
             if code in [1, 2, 3]: desc = "Partly Cloudy"
             elif code in [45, 48]: desc = "Foggy"
             elif code >= 51: desc = "Rainy"
             elif code >= 71: desc = "Snow"
-            
-            return f"{temp}°C", f"{city.capitalize()} ({desc})"
 
-    except Exception:
-        # Return fallback silently if internet is down
-        pass
+            result = (f"{temp}°C", f"{city.capitalize()} ({desc})")
+            self._fresh.set(key, result)
+            with self._lock:
+                self._last[key] = result
+                self._failed_at.pop(key, None)
+            return result
+        except Exception:
+            with self._lock:
+                self._failed_at[key] = time.time()
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, city, wait=0):
+        """Returns (temp, desc) without waiting on open-meteo for more than `wait` seconds."""
+        key = city.lower()
+        result = self._fresh.get(key)
+        if result is not None:
+            return result
+
+        with self._lock:
+            future = self._inflight.get(key)
+            recently_failed = time.time() - self._failed_at.get(key, 0) < self.retry_after
+            if future is None and not recently_failed:
+                future = self._pool.submit(self._fetch, city)
+                self._inflight[key] = future
+            stale = self._last.get(key)
+
+        if future is not None and stale is None and wait > 0:
+            try:
+                result = future.result(timeout=wait)
+            except Exception:
+                result = None
+            if result is not None:
+                return result
+
+        if stale is not None:
+            return stale
+        if future is not None:
+            return "--", f"{city} (Updating...)"
+        return "--", f"{city} (Offline)"
 
-    return fallback_temp, fallback_desc
+@st.cache_resource(show_spinner=False)
+def get_weather_service():
+    return WeatherService()
+
+def get_real_time_weather(city="Jaipur"):
+    """
+    Returns (temperature, description) for the dashboard from the shared
+    weather cache. Never blocks Home for more than WEATHER_WAIT seconds.
+    """
+    try:
+        return get_weather_service().get(city, wait=WEATHER_WAIT)
+    except Exception:
+        # Return fallback silently if anything goes wrong
+        return "--", f"{city} (Offline)"
 
 # --- 4. CLOUD DATA MANAGEMENT (Timetable & Reminders) ---
 def load_cloud_data():
     """
     Loads Reminders & Timetable from Google Sheets.
     Handles legacy date formats and parses them into usable objects.
+    Also records the loaded rows as the baseline for delta syncs.
     """
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
         uid = st.session_state.get('user_id')
         
-        # Read Sheet (Return if empty or fails)
+        # Read this user's rows (Return if empty or fails)
         try: 
-            df = conn.read(worksheet="Reminders", ttl=0)
+            backend = get_row_backend("Reminders", tuple(REMINDER_COLUMNS), REMINDER_KEY)
+            my_data = backend.read_rows(uid)
         except Exception: 
             return 
 
-        if not df.empty and "UserID" in df.columns:
-            # Filter for current user
-            my_data = df[df["UserID"] == str(uid)]
+        if my_data:
             loaded_reminders = []
             loaded_timetable = []
+            synced_rows = {}
             
-            for _, row in my_data.iterrows():
+            for row in my_data:
+                # Legacy rows (pre-TaskID) get a fresh ID; the blank key stays in the
+                # baseline so the next sync replaces them with the ID'd versions.
+                task_id = str(row.get('TaskID', '')).strip()
+                synced_rows[(str(uid), task_id)] = {c: str(row.get(c, "")) for c in REMINDER_COLUMNS}
+                if not task_id:
+                    task_id = str(uuid.uuid4())
+
                 # PARSE ALARMS
                 if row['Type'] == "Alarm":
                     loaded_reminders.append({
+                        "id": task_id,
                         "task": row['Task'], 
                         "time": row['Time'], 
                         "notified": (row['Status'] == "Done")
@@ -368,6 +1184,7 @@ def load_cloud_data():
                         time_val = raw_time
 
                     loaded_timetable.append({
+                        "id": task_id,
                         "Date": date_val, 
                         "Time": time_val,
                         "Activity": row['Task'], 
@@ -380,230 +1197,207 @@ def load_cloud_data():
             # Update Session State
             st.session_state['reminders'] = loaded_reminders
             st.session_state['timetable_slots'] = loaded_timetable
+            st.session_state['synced_reminder_rows'] = synced_rows
             
     except Exception as e:
         print(f"Cloud Load Error: {e}")
 
 # --- 5. CHAT HISTORY DATABASE (Google Sheets + Drive) ---
+CHAT_COLUMNS = ["UserID", "SessionID", "SessionName", "Role", "Content", "Image", "Timestamp"]
+CHAT_KEY = ("UserID", "SessionID")
+CHAT_SESSION_COLUMNS = ["UserID", "SessionID", "SessionName", "LastActive"]
+CHAT_PARTITIONS = 16 # Fixed once data exists: changing it re-routes users to other tabs
 
-# --- HELPER: Upload to Google Drive ---
-def upload_to_drive(image_b64):
+def get_chat_partition(uid):
     """
-    Uploads an image to Google Drive using the Service Account.
-    Returns a direct link that allows the app to display the image.
+    Chat rows are hash-partitioned by user: every message of a user lives in
+    one 'ChatHistory-NN' tab, so opening a session never touches other partitions.
     """
-    import io
-    import base64
-    from google.oauth2 import service_account
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaIoBaseUpload
-
-    try:
-        # 1. Load Credentials
-        if "connections" in st.secrets and "gsheets" in st.secrets["connections"]:
-             creds_info = st.secrets["connections"]["gsheets"]
-        else:
-             print("⚠️ No Google Credentials found.")
-             return ""
-
-        creds = service_account.Credentials.from_service_account_info(
-            creds_info,
-            scopes=['https://www.googleapis.com/auth/drive']
-        )
-        
-        # 2. Build Drive Service
-        service = build('drive', 'v3', credentials=creds)
-        folder_id = st.secrets.get("DRIVE_FOLDER_ID")
-
-        if not folder_id:
-            print("⚠️ DRIVE_FOLDER_ID missing in secrets.")
-            return ""
-
-        # 3. Prepare File Metadata
-        file_metadata = {
-            'name': f"TimeHunt_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg",
-            'parents': [folder_id]
-        }
-        
-        # Convert Base64 back to binary stream
-        img_data = base64.b64decode(image_b64)
-        media = MediaIoBaseUpload(io.BytesIO(img_data), mimetype='image/jpeg')
-
-        # 4. Upload File
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        
-        file_id = file.get('id')
+    import zlib
+    shard = zlib.crc32(str(uid).encode("utf-8")) % CHAT_PARTITIONS
+    return f"ChatHistory-{shard:02d}"
 
-        # 5. Set Permissions (Anyone with link can view)
-        permission = {
-            'type': 'anyone',
-            'role': 'reader',
-        }
-        service.permissions().create(
-            fileId=file_id,
-            body=permission,
-            fields='id',
-        ).execute()
+def get_chat_backend(uid):
+    return get_row_backend(get_chat_partition(uid), tuple(CHAT_COLUMNS), CHAT_KEY)
 
-        # 6. Return Display Link
-        return f"https://drive.google.com/uc?id={file_id}"
+def get_session_index():
+    """Lightweight one-row-per-session index used for the sidebar list."""
+    return get_row_backend("ChatSessions", tuple(CHAT_SESSION_COLUMNS), CHAT_KEY)
 
-    except Exception as e:
-        print(f"Drive Upload Error: {e}")
-        return ""
+def build_chat_row(role, content, image_ref=None):
+    """
+    Builds one ChatHistory row for the current session.
+    Images (asset IDs from the image store) are pushed to Drive first so
+    only the link is stored; if Drive is unavailable the asset ID is kept.
+    """
+    uid = str(st.session_state.get('user_id', 'Unknown'))
+    sid = str(st.session_state.get('current_session_id', 'Unknown'))
+    sname = str(st.session_state.get('current_session_name', 'New Chat'))
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    final_image_value = ""
+    
+    if image_ref:
+        # Check if it's already a link (legacy support)
+        if str(image_ref).startswith("http"):
+            final_image_value = image_ref
+        else:
+            image_bytes = get_image_store().read(image_ref)
+            with st.spinner("☁️ Syncing High-Res Image to Drive..."):
+                # PASS USER ID AND SESSION ID HERE FOR NAMING
+                name_tag = f"{uid}_{sid}"
+                link = upload_to_drive(image_bytes, filename_prefix=name_tag) if image_bytes else ""
+                
+                if link:
+                    final_image_value = link
+                    st.toast("Image saved to Drive!", icon="💾")
+                else:
+                    final_image_value = image_ref # Upload failed: still resolvable on this server
+
+    return {
+        "UserID": uid, 
+        "SessionID": sid, 
+        "SessionName": sname,
+        "Role": str(role), 
+        "Content": str(content), 
+        "Image": final_image_value, 
+        "Timestamp": ts
+    }
 
-def get_all_chats():
-    """Reads the entire ChatHistory sheet safely."""
+def append_chat_rows(rows):
+    """
+    Appends N chat rows to the user's partition in one write.
+    Never reads existing history. New sessions are added to the session index,
+    and every append moves its session's LastActive forward.
+    """
+    if not rows: return
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        return conn.read(worksheet="ChatHistory", ttl=0)
-    except Exception:
-        return pd.DataFrame(columns=["UserID", "SessionID", "SessionName", "Role", "Content", "Image", "Timestamp"])
+        uid = rows[0]["UserID"]
+        get_chat_backend(uid).append_rows(rows)
+
+        # Session index: new sessions are written at once (so the sidebar lists them);
+        # LastActive bumps for known ones go through the write-behind queue (coalesced per session)
+        indexed = st.session_state.setdefault('indexed_chat_sessions', set())
+        index = get_session_index()
+        sessions = {}
+        for row in rows:
+            sessions[row["SessionID"]] = {
+                "UserID": row["UserID"],
+                "SessionID": row["SessionID"],
+                "SessionName": row["SessionName"],
+                "LastActive": row["Timestamp"]
+            }
+        new_sessions = [s for sid, s in sessions.items() if sid not in indexed]
+        if new_sessions:
+            index.upsert_rows(new_sessions)
+            indexed.update(s["SessionID"] for s in new_sessions)
+        for sid, session in sessions.items():
+            if session not in new_sessions:
+                get_write_queue().submit(
+                    ("ChatSessions", str(uid), sid),
+                    lambda _, target: index.upsert_rows([target]),
+                    session
+                )
+    except Exception as e:
+        st.error(f"❌ Cloud Save Error: {e}")
 
-def save_chat_to_cloud(role, content, image_b64=None):
+def save_chat_to_cloud(role, content, image_ref=None):
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        
-        uid = str(st.session_state.get('user_id', 'Unknown'))
-        sid = str(st.session_state.get('current_session_id', 'Unknown'))
-        sname = str(st.session_state.get('current_session_name', 'New Chat'))
-        ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        final_image_value = ""
-        
-        if image_b64:
-            # Check if it's already a link (legacy support)
-            if str(image_b64).startswith("http"):
-                final_image_value = image_b64
-            else:
-                with st.spinner("☁️ Syncing High-Res Image to Drive..."):
-                    # PASS USER ID AND SESSION ID HERE FOR NAMING
-                    name_tag = f"{uid}_{sid}"
-                    link = upload_to_drive(image_b64, filename_prefix=name_tag)
-                    
-                    if link:
-                        final_image_value = link
-                        st.toast("Image saved to Drive!", icon="💾")
-                    else:
-                        final_image_value = "" # Upload failed
-
-        # Read & Update Sheet
-        try:
-            df_existing = conn.read(worksheet="ChatHistory", ttl=0)
-            # Handle empty sheet case
-            if df_existing is None or df_existing.empty:
-                df_existing = pd.DataFrame(columns=["UserID", "SessionID", "SessionName", "Role", "Content", "Image", "Timestamp"])
-        except Exception:
-            df_existing = pd.DataFrame(columns=["UserID", "SessionID", "SessionName", "Role", "Content", "Image", "Timestamp"])
-        
-        new_row = pd.DataFrame([{
-            "UserID": uid, 
-            "SessionID": sid, 
-            "SessionName": sname,
-            "Role": str(role), 
-            "Content": str(content), 
-            "Image": final_image_value, 
-            "Timestamp": ts
-        }])
-        
-        df_final = pd.concat([df_existing, new_row], ignore_index=True)
-        # Ensure strict string conversion to avoid errors
-        df_final = df_final.fillna("").astype(str)
-        
-        conn.update(worksheet="ChatHistory", data=df_final)
-        
+        append_chat_rows([build_chat_row(role, content, image_ref=image_ref)])
     except Exception as e:
         st.error(f"❌ Cloud Save Error: {e}")
 
+def migrate_legacy_chats(uid):
+    """
+    One-time move of a user's rows from the old single 'ChatHistory' tab
+    into their partition + session index. Returns True if anything moved.
+    """
+    legacy = get_row_backend("ChatHistory", tuple(CHAT_COLUMNS), CHAT_KEY)
+    rows = legacy.read_rows(uid)
+    if not rows:
+        return False
+
+    rows = sorted(rows, key=lambda r: r.get("Timestamp", ""))
+    get_chat_backend(uid).append_rows(rows)
+
+    sessions = {}
+    for row in rows:
+        sessions[row["SessionID"]] = {
+            "UserID": row["UserID"],
+            "SessionID": row["SessionID"],
+            "SessionName": row["SessionName"],
+            "LastActive": row["Timestamp"]
+        }
+    get_session_index().upsert_rows(list(sessions.values()))
+    legacy.delete_rows([(uid, sid) for sid in sessions])
+    return True
+
 def load_chat_sessions():
-    """Returns a unique list of chat sessions."""
-    df = get_all_chats()
+    """Returns a unique list of chat sessions (reads only the session index)."""
     uid = str(st.session_state.get('user_id'))
-    
-    if not df.empty and "UserID" in df.columns:
-        df["UserID"] = df["UserID"].astype(str)
-        my_chats = df[df["UserID"] == uid]
-        
-        if not my_chats.empty:
-            if "Timestamp" in my_chats.columns:
-                my_chats = my_chats.sort_values(by="Timestamp", ascending=False)
-            unique_sessions = my_chats[["SessionID", "SessionName"]].drop_duplicates(subset=["SessionID"])
-            return unique_sessions.to_dict('records')
-    return []
+    try:
+        # Once per browser session, pull over any pre-partition history
+        if not st.session_state.get('legacy_chats_checked'):
+            st.session_state['legacy_chats_checked'] = True
+            migrate_legacy_chats(uid)
+
+        sessions = get_session_index().read_rows(uid)
+    except Exception:
+        return []
+
+    sessions = sorted(sessions, key=lambda s: s.get("LastActive", ""), reverse=True)
+    return [{"SessionID": s["SessionID"], "SessionName": s["SessionName"]} for s in sessions]
 
 def delete_chat_session(session_id):
-    """Deletes a specific chat session."""
+    """Deletes a specific chat session (its rows in the partition + index entry)."""
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        df = conn.read(worksheet="ChatHistory", ttl=0)
-        
-        if not df.empty and "SessionID" in df.columns:
-            df_filtered = df[df["SessionID"].astype(str) != str(session_id)]
-            conn.update(worksheet="ChatHistory", data=df_filtered)
-            st.toast("Chat deleted.", icon="🗑️")
+        uid = str(st.session_state.get('user_id'))
+        get_chat_backend(uid).delete_rows([(uid, str(session_id))])
+        get_write_queue().cancel(("ChatSessions", uid, str(session_id))) # A queued LastActive bump would re-add it
+        get_session_index().delete_rows([(uid, str(session_id))])
+        st.session_state.get('indexed_chat_sessions', set()).discard(str(session_id))
+        st.toast("Chat deleted.", icon="🗑️")
     except Exception as e:
         st.error(f"Could not delete: {e}")
 
 def load_messages_for_session(session_id):
     """
-    Loads messages for a specific session.
+    Loads messages for a specific session (reads only that session's rows).
     ✅ FIXED: Handles empty cells correctly to allow images to load.
     """
-    df = get_all_chats()
-    
-    if not df.empty and "SessionID" in df.columns:
-        df["SessionID"] = df["SessionID"].astype(str)
-        try:
-            messages = df[df["SessionID"] == str(session_id)].sort_values(by="Timestamp")
-        except KeyError:
-            messages = df[df["SessionID"] == str(session_id)]
+    uid = str(st.session_state.get('user_id'))
+    try:
+        messages = get_chat_backend(uid).read_key_rows((uid, str(session_id)))
+    except Exception:
+        return []
+
+    normalized_history = []
+    for row in sorted(messages, key=lambda r: r.get("Timestamp", "")):
+        img_val = row.get("Image")
+        # Check for NaN or empty string
+        if img_val is None or str(img_val).lower() == "nan" or str(img_val).strip() == "":
+            img_val = None
         
-        normalized_history = []
-        for _, row in messages.iterrows():
-            img_val = row["Image"] if "Image" in row else None
-            # Check for NaN or empty string
-            if pd.isna(img_val) or str(img_val).lower() == "nan" or str(img_val).strip() == "":
-                img_val = None
-            
-            normalized_history.append({
-                "role": str(row.get("Role", "user")).lower(),
-                "text": str(row.get("Content", "")),
-                "image": img_val 
-            })
-        return normalized_history
-    return []
+        normalized_history.append({
+            "role": str(row.get("Role", "user")).lower(),
+            "text": str(row.get("Content", "")),
+            "image": img_val 
+        })
+    return normalized_history
 
 # --- 6. FEEDBACK & SUPPORT SYSTEM ---
 
 def save_feedback(query_text):
     """Submits user feedback/bugs to the 'Feedbacks' sheet."""
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        
         uid = str(st.session_state.get('user_id', 'Unknown'))
         name = str(st.session_state.get('user_name', 'Anonymous'))
         ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
         
-        try:
-            df = conn.read(worksheet="Feedbacks", ttl=0)
-        except Exception:
-            df = pd.DataFrame(columns=["UserID", "Name", "Timestamp", "Query", "Reply", "Status"])
-        
-        new_row = pd.DataFrame([{
+        get_feedback_backend().append_rows([{
             "UserID": uid, "Name": name, "Timestamp": ts, 
             "Query": query_text, "Reply": "", "Status": "Open"
         }])
-        
-        df_final = pd.concat([df, new_row], ignore_index=True)
-        conn.update(worksheet="Feedbacks", data=df_final)
         return True
     except Exception as e:
         st.error(f"Could not send feedback: {e}")
@@ -612,23 +1406,149 @@ def save_feedback(query_text):
 def get_my_feedback_status():
     """Retrieves feedback status and admin replies."""
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        df = conn.read(worksheet="Feedbacks", ttl=0)
-        
         uid = str(st.session_state.get('user_id'))
-        if not df.empty and "UserID" in df.columns:
+        df = pd.DataFrame(get_feedback_backend().read_rows(uid), columns=FEEDBACK_COLUMNS)
+        if not df.empty:
             # Sort by newest first
-            return df[df["UserID"] == uid].sort_values(by="Timestamp", ascending=False)
+            return df.sort_values(by="Timestamp", ascending=False)
     except Exception:
         pass
     return pd.DataFrame()
 
+# --- HELPER: Size-appropriate media variants ---
+STATIC_DIR = os.path.join(current_dir, "static") # Served at app/static/ when server.enableStaticServing is on
+MEDIA_DIR = os.path.join(STATIC_DIR, "media")
+MEDIA_MANIFEST = os.path.join(MEDIA_DIR, "manifest.json")
+
+# source -> purpose -> how it is displayed. Images are sized for 2x screens.
+MEDIA_VARIANT_SPECS = {
+    "1000592991.png": {
+        "splash": {"width": 300, "format": "WEBP", "quality": 85, "shown": "Splash logo (150px)"},
+        "avatar": {"width": 96, "format": "WEBP", "quality": 85, "shown": "AI chat avatar"},
+        "icon": {"width": 64, "format": "PNG", "shown": "Browser tab icon"},
+    },
+    "background_small.jpg": {
+        "background": {"width": 1280, "format": "WEBP", "quality": 60, "shown": "Login background (90% dimmed)"},
+    },
+    "rain.mp3": {
+        "loop": {"bitrate": "96k", "format": "MP3", "shown": "Focus Zone 'Rainfall' loop"},
+    },
+}
+
+def _render_media_variant(source, spec, target):
+    """Writes one variant of source to target. Returns False if this host can't encode it."""
+    import shutil
+    import subprocess
+    from PIL import Image
+
+    if "bitrate" in spec:
+        # No pure-Python MP3/Opus encoder ships with the app; ffmpeg is used when present
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            return False
+        subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-i", source, "-vn", "-ac", "1",
+             "-b:a", spec["bitrate"], "-f", spec["format"].lower(), target],
+            check=True, timeout=120,
+        )
+        return True
+
+    with Image.open(source) as img:
+        img = img.convert("RGBA")
+        if img.width > spec["width"]:
+            height = round(spec["width"] * img.height / img.width)
+            img = img.resize((spec["width"], height), Image.Resampling.LANCZOS)
+        if spec["format"] == "WEBP":
+            img.save(target, format="WEBP", quality=spec.get("quality", 80), method=6)
+        else:
+            img.save(target, format=spec["format"], optimize=True)
+    return True
+
+def build_media_variants(specs=MEDIA_VARIANT_SPECS, out_dir=MEDIA_DIR):
+    """
+    Renders every variant in specs into out_dir (static/media) and writes the
+    manifest. Variant file names carry the source's hash, so unchanged sources
+    are skipped and a replaced asset gets a new URL.
+    """
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for source, purposes in specs.items():
+        if not os.path.exists(source):
+            continue
+        with open(source, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        entry = {"sha": digest, "bytes": os.path.getsize(source), "variants": {}}
+
+        for purpose, spec in purposes.items():
+            stem = os.path.splitext(os.path.basename(source))[0]
+            name = f"{stem}.{purpose}.{digest}.{spec['format'].lower()}"
+            target = os.path.join(out_dir, name)
+            old = previous.get(source, {}).get("variants", {}).get(purpose, {})
+
+            if old.get("file") == name and os.path.exists(target):
+                entry["variants"][purpose] = old
+                continue
+            tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+            try:
+                if not _render_media_variant(source, spec, tmp_path):
+                    entry["variants"][purpose] = {"skipped": "no encoder available", "shown": spec["shown"]}
+                    continue
+                os.replace(tmp_path, target)
+            except Exception as e:
+                entry["variants"][purpose] = {"skipped": str(e)[:200], "shown": spec["shown"]}
+                continue
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            entry["variants"][purpose] = {"file": name, "bytes": os.path.getsize(target), "shown": spec["shown"]}
+        manifest[source] = entry
+
+    tmp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    # Variants the previous build made that are no longer listed (replaced source, dropped purpose)
+    current = {v.get("file") for e in manifest.values() for v in e["variants"].values()}
+    for e in previous.values():
+        for v in e.get("variants", {}).values():
+            if v.get("file") and v["file"] not in current:
+                try:
+                    os.remove(os.path.join(out_dir, v["file"]))
+                except OSError:
+                    pass
+    return manifest
+
+@st.cache_resource(show_spinner=False)
+def get_media_manifest():
+    """The variant manifest, built (or refreshed) once per process."""
+    try:
+        return build_media_variants()
+    except Exception as e:
+        print(f"Media variants unavailable, serving originals: {e}")
+        return {}
+
+def media_path(source, purpose):
+    """Path of the variant of source made for purpose, or source itself if there is none."""
+    variant = get_media_manifest().get(source, {}).get("variants", {}).get(purpose, {})
+    if variant.get("file"):
+        path = os.path.join(MEDIA_DIR, variant["file"])
+        if os.path.exists(path):
+            return path
+    return source
+
 # --- 7. PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Time Hunt AI", 
     layout="wide", 
-    page_icon="1000592991.png", # Ensure this file exists
+    page_icon=media_path("1000592991.png", "icon"), # Falls back to the original if missing
     initial_sidebar_state="collapsed"
 )
 
@@ -641,6 +1561,191 @@ except ImportError:
     HAS_GEMINI = False
     # Note: If missing, features will degrade gracefully.
 
+GEMINI_MODELS = [
+    "gemini-2.5-flash",          # 🚀 TOP TIER: Best reasoning
+    "gemini-2.0-flash",          # 🛡️ STABLE: Reliable fallback
+    "gemini-2.0-flash-lite",     # ⚡ SPEED: Ultra-fast fallback
+]
+GEMINI_COOLDOWN = 60          # Seconds a key/model rests after a 429 (doubles per repeat)
+GEMINI_MAX_COOLDOWN = 900
+GEMINI_AUTH_COOLDOWN = 3600   # Invalid / revoked keys are benched for an hour
+AI_HEDGE_DELAY = float(os.environ.get("AI_HEDGE_DELAY", 8))      # Start a backup attempt if no answer by then (<= 0: sequential)
+AI_REQUEST_BUDGET = float(os.environ.get("AI_REQUEST_BUDGET", 60)) # Give up on the whole fallback chain after this
+AI_STREAMING = os.environ.get("AI_STREAMING", "1") != "0" # Chat renders tokens as they arrive
+AI_STREAM_STALL = float(os.environ.get("AI_STREAM_STALL", 20)) # Max silence between streamed chunks once text has started
+AI_CACHE_TTL = 3600       # Seconds a cached AI reply may be reused
+AI_CACHE_MAX_ENTRIES = 500
+
+class GeminiClientPool:
+    """
+    Process-wide pool of long-lived genai.Clients, one per API key.
+    Tracks health per (key, model): a 429 benches that pair with an
+    exponential cool-down, an auth error benches the key for every model.
+    Callers ask for keys in order: healthy first, least recently throttled first.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._health = {} # (key, model or None) -> {"until", "strikes", "throttled_at"}
+
+    def client(self, key):
+        with self._lock:
+            if key not in self._clients:
+                from google import genai
+                from google.genai import types
+                # run_hedged can't cancel a running call; the HTTP timeout is what ends an abandoned one
+                self._clients[key] = genai.Client(
+                    api_key=key, http_options=types.HttpOptions(timeout=int(AI_REQUEST_BUDGET * 1000))
+                )
+            return self._clients[key]
+
+    def _state(self, key, model):
+        return self._health.get((key, model), {"until": 0, "strikes": 0, "throttled_at": 0})
+
+    def ordered_keys(self, keys, model=None):
+        """Usable keys for a model, best first. Falls back to the soonest-recovering key."""
+        now = time.time()
+        keys = [k for k in keys if isinstance(k, str) and k.strip()]
+        with self._lock:
+            def resting_until(k):
+                return max(self._state(k, None)["until"], self._state(k, model)["until"])
+
+            ready = [k for k in keys if resting_until(k) <= now]
+            if not ready and keys:
+                return [min(keys, key=resting_until)]
+            return sorted(ready, key=lambda k: self._state(k, model)["throttled_at"])
+
+    @staticmethod
+    def _error_kind(exc):
+        code = getattr(exc, "code", None)
+        text = str(exc)
+        if code == 429 or "429" in text or "RESOURCE_EXHAUSTED" in text:
+            return "quota"
+        if code in (401, 403) or "API_KEY_INVALID" in text or "PERMISSION_DENIED" in text:
+            return "auth"
+        return "other"
+
+    def report_success(self, key, model):
+        with self._lock:
+            self._health.pop((key, model), None)
+
+    def report_failure(self, key, model, exc):
+        kind = self._error_kind(exc)
+        if kind == "other":
+            return # Transient / model-side errors say nothing about the key
+        now = time.time()
+        with self._lock:
+            slot = (key, None) if kind == "auth" else (key, model)
+            state = dict(self._state(*slot))
+            state["strikes"] += 1
+            if kind == "auth":
+                state["until"] = now + GEMINI_AUTH_COOLDOWN
+            else:
+                state["until"] = now + min(GEMINI_MAX_COOLDOWN, GEMINI_COOLDOWN * 2 ** (state["strikes"] - 1))
+                state["throttled_at"] = now
+            self._health[slot] = state
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_pool():
+    return GeminiClientPool()
+
+class LatencyStats:
+    """Rolling per-metric latency samples (seconds) with simple percentiles."""
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+
+    def record(self, name, seconds, ok=True):
+        with self._lock:
+            samples = self._samples.setdefault(name, [])
+            if ok:
+                samples.append(seconds)
+                del samples[:-self.window]
+            counts = self._counts.setdefault(name, {"ok": 0, "failed": 0})
+            counts["ok" if ok else "failed"] += 1
+
+    def summary(self, name):
+        """{'count', 'failed', 'p50', 'p95'} or None if nothing was recorded."""
+        with self._lock:
+            samples = sorted(self._samples.get(name, []))
+            counts = dict(self._counts.get(name, {"ok": 0, "failed": 0}))
+        if not samples and not counts["failed"]:
+            return None
+        pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] if samples else None
+        return {"count": counts["ok"], "failed": counts["failed"], "p50": pick(0.5), "p95": pick(0.95)}
+
+@st.cache_resource(show_spinner=False)
+def get_ai_metrics():
+    return LatencyStats()
+
+@st.cache_resource(show_spinner=False)
+def get_ai_response_cache():
+    """Replies to cacheable prompts, shared by all sessions (LRU + TTL)."""
+    return TTLCache(ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES)
+
+def ai_cache_key(prompt, context="", file_data=None, enable_search=False):
+    """Hash of the normalised prompt + model list + whatever context the answer depends on."""
+    normalised = " ".join(str(prompt or "").split()).casefold()
+    digest = hashlib.sha256()
+    for part in (normalised, "|".join(GEMINI_MODELS), str(enable_search), str(context)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    if file_data:
+        digest.update(hashlib.sha256(file_data).digest())
+    return digest.hexdigest()
+
+@st.cache_resource(show_spinner=False)
+def get_ai_executor():
+    """Shared worker threads for model/media calls (hedged attempts outlive the rerun that lost)."""
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini")
+
+def run_hedged(attempts, hedge_delay=AI_HEDGE_DELAY, budget=AI_REQUEST_BUDGET):
+    """
+    Runs zero-arg callables in fallback order and returns the first result.
+    The next attempt starts as soon as one fails, or when the ones running have
+    been silent for `hedge_delay` seconds (hedge_delay <= 0: never race, strict
+    fallback order). Losers are cancelled if not started
+    yet and otherwise ignored. Raises the last error (or TimeoutError) if
+    nothing succeeds within `budget` seconds.
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    executor = get_ai_executor()
+    queue = list(attempts)
+    running = set()
+    last_error = None
+    deadline = time.time() + budget
+
+    def launch():
+        if queue:
+            running.add(executor.submit(queue.pop(0)))
+
+    launch()
+    try:
+        while running:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            timeout = min(hedge_delay, remaining) if (queue and hedge_delay > 0) else remaining
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                launch() # Still waiting: race the next fallback
+                continue
+            for future in done:
+                running.discard(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    last_error = e
+                    launch()
+    finally:
+        for future in running:
+            future.cancel()
+    raise last_error or TimeoutError("AI request budget exhausted")
+
 # --- 9. THE BRAIN: SYSTEM INSTRUCTION (Corrected Identity) ---
 SYSTEM_INSTRUCTION = """
 IDENTITY PROTOCOL:
@@ -728,110 +1833,176 @@ def initialize_session_state():
         unique_keys = list(set([k for k in keys if isinstance(k, str) and k.strip()]))
         st.session_state['gemini_api_keys'] = unique_keys
         
+# --- HELPER: Static assets (logo, backgrounds, alarm sound) ---
+class StaticAssets:
+    """
+    Hands out URLs for bundled media instead of re-encoding them on every render.
+    With static serving on, each file is copied once into ./static under a
+    content-hashed name and referenced as app/static/<name>, so the websocket
+    delta carries a short URL and the browser fetches (and revalidates) the file
+    itself. Otherwise the base64 data URI is built once per process.
+    """
+    def __init__(self, root=STATIC_DIR, serve_static=None):
+        self.root = root
+        if serve_static is None:
+            try:
+                serve_static = bool(st.get_option("server.enableStaticServing"))
+            except Exception:
+                serve_static = False
+        self.serve_static = serve_static
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    def _publish(self, path, data):
+        """Copies the file into the static folder; returns its app/static URL."""
+        rel_path = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        if not rel_path.startswith(os.pardir):
+            return f"app/static/{rel_path.replace(os.sep, '/')}" # Already served (e.g. media variants)
+
+        stem, ext = os.path.splitext(os.path.basename(path))
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        target = os.path.join(self.root, name)
+        if not os.path.exists(target):
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        return f"app/static/{name}"
+
+    def url(self, path, mime_type=None):
+        """URL usable in <img>/<audio>/CSS for a bundled file, or None if it's missing."""
+        import mimetypes
+        with self._lock:
+            if path in self._urls:
+                return self._urls[path]
+            if not os.path.exists(path):
+                return None # Not cached: the file may be deployed later
+
+            with open(path, "rb") as f:
+                data = f.read()
+            url = None
+            if self.serve_static:
+                try:
+                    url = self._publish(path, data)
+                except OSError:
+                    url = None # Read-only checkout: fall back to inlining
+            if url is None:
+                mime_type = mime_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+                url = f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+            self._urls[path] = url
+            return url
+
+@st.cache_resource(show_spinner=False)
+def get_static_assets():
+    return StaticAssets()
+
 # --- 11. CINEMATIC SPLASH SCREEN (Productive & Engaging) ---
+SPLASH_MAX_SECONDS = 8 # Client-side cap in case the ready marker never arrives
+
 def show_comet_splash():
     """
-    Displays a high-quality introductory animation.
+    Displays a high-quality introductory animation, once per session.
     Now styled to be inspiring and modern, rather than military.
+    The overlay is pure CSS: the script keeps running underneath it and
+    end_comet_splash() lifts it when the first run finishes.
+    Returns True if the splash was shown in this run.
     """
-    if not st.session_state['splash_played']:
-        placeholder = st.empty()
-        
-        # 1. Image Safety Check
-        encoded_img = ""
-        has_image = False
-        try:
-            if os.path.exists("1000592991.png"):
-                with open("1000592991.png", "rb") as f:
-                    encoded_img = base64.b64encode(f.read()).decode()
-                    has_image = True
-        except Exception: 
-            pass
+    if st.session_state.get('splash_played'):
+        return False
+    st.session_state['splash_played'] = True
 
-        # 2. Render Animation
-        with placeholder.container():
-            st.markdown(textwrap.dedent(f"""
-            <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;700&display=swap');
-            
-            .main-void {{ 
-                position: fixed; top: 0; left: 0; width: 100%; height: 100vh; 
-                background: #0E1117 !important; 
-                display: flex; flex-direction: column; 
-                justify-content: center; align-items: center; 
-                z-index: 999999; 
-                animation: fadeOut 1.0s ease-in-out 4.5s forwards; 
-            }}
-            
-            .logo-container {{
-                width: 150px; height: 150px;
-                border-radius: 50%;
-                background: linear-gradient(135deg, #B5FF5F, #00E5FF);
-                padding: 3px; /* Border width */
-                box-shadow: 0 0 40px rgba(0, 229, 255, 0.3);
-                animation: pulse 2s infinite;
-                display: flex; justify-content: center; align-items: center;
-            }}
-            
-            .logo-inner {{
-                width: 100%; height: 100%;
-                border-radius: 50%;
-                background: #000;
-                display: flex; justify-content: center; align-items: center;
-                overflow: hidden;
-            }}
-            
-            .logo-img {{ width: 100%; height: 100%; object-fit: cover; }}
-            
-            .title-text {{
-                font-family: 'Inter', sans-serif;
-                color: #FFFFFF;
-                font-size: 32px;
-                font-weight: 700;
-                letter-spacing: 4px;
-                margin-top: 30px;
-                opacity: 0;
-                animation: slideUp 0.8s ease-out 0.5s forwards;
-            }}
-            
-            .subtitle-text {{
-                font-family: 'Inter', sans-serif;
-                color: #B5FF5F;
-                font-size: 14px;
-                letter-spacing: 2px;
-                text-transform: uppercase;
-                margin-top: 10px;
-                opacity: 0;
-                animation: slideUp 0.8s ease-out 1.0s forwards;
-            }}
-            
-            @keyframes pulse {{ 0% {{ transform: scale(1); }} 50% {{ transform: scale(1.05); }} 100% {{ transform: scale(1); }} }}
-            @keyframes slideUp {{ from {{ transform: translateY(20px); opacity: 0; }} to {{ transform: translateY(0); opacity: 1; }} }}
-            @keyframes fadeOut {{ to {{ opacity: 0; visibility: hidden; }} }}
-            </style>
-            
-            <div class="main-void">
-                <div class="logo-container">
-                    <div class="logo-inner">
-                        {f'<img src="data:image/png;base64,{encoded_img}" class="logo-img">' if has_image else '<span style="font-size:50px;">⏳</span>'}
-                    </div>
-                </div>
-                <div class="title-text">TIME HUNT AI</div>
-                <div class="subtitle-text">Focus • Execute • Achieve</div>
+    # 1. Image Safety Check
+    logo_url = get_static_assets().url(media_path("1000592991.png", "splash"))
+
+    # 2. Render Animation
+    st.markdown(textwrap.dedent(f"""
+    <style>
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;700&display=swap');
+    
+    .main-void {{ 
+        position: fixed; top: 0; left: 0; width: 100%; height: 100vh; 
+        background: #0E1117 !important; 
+        display: flex; flex-direction: column; 
+        justify-content: center; align-items: center; 
+        z-index: 999999; 
+        animation: fadeOut 0.6s ease-in-out {SPLASH_MAX_SECONDS}s forwards; 
+    }}
+    /* Startup work done (see end_comet_splash): finish the intro and fade out */
+    body:has(.timehunt-ready) .main-void {{
+        animation: fadeOut 0.6s ease-in-out 0.4s forwards;
+        pointer-events: none;
+    }}
+    
+    .logo-container {{
+        width: 150px; height: 150px;
+        border-radius: 50%;
+        background: linear-gradient(135deg, #B5FF5F, #00E5FF);
+        padding: 3px; /* Border width */
+        box-shadow: 0 0 40px rgba(0, 229, 255, 0.3);
+        animation: pulse 2s infinite;
+        display: flex; justify-content: center; align-items: center;
+    }}
+    
+    .logo-inner {{
+        width: 100%; height: 100%;
+        border-radius: 50%;
+        background: #000;
+        display: flex; justify-content: center; align-items: center;
+        overflow: hidden;
+    }}
+    
+    .logo-img {{ width: 100%; height: 100%; object-fit: cover; }}
+    
+    .title-text {{
+        font-family: 'Inter', sans-serif;
+        color: #FFFFFF;
+        font-size: 32px;
+        font-weight: 700;
+        letter-spacing: 4px;
+        margin-top: 30px;
+        opacity: 0;
+        animation: slideUp 0.8s ease-out 0.5s forwards;
+    }}
+    
+    .subtitle-text {{
+        font-family: 'Inter', sans-serif;
+        color: #B5FF5F;
+        font-size: 14px;
+        letter-spacing: 2px;
+        text-transform: uppercase;
+        margin-top: 10px;
+        opacity: 0;
+        animation: slideUp 0.8s ease-out 1.0s forwards;
+    }}
+    
+    @keyframes pulse {{ 0% {{ transform: scale(1); }} 50% {{ transform: scale(1.05); }} 100% {{ transform: scale(1); }} }}
+    @keyframes slideUp {{ from {{ transform: translateY(20px); opacity: 0; }} to {{ transform: translateY(0); opacity: 1; }} }}
+    @keyframes fadeOut {{ to {{ opacity: 0; visibility: hidden; }} }}
+    </style>
+    
+    <div class="main-void">
+        <div class="logo-container">
+            <div class="logo-inner">
+                {f'<img src="{logo_url}" class="logo-img">' if logo_url else '<span style="font-size:50px;">⏳</span>'}
             </div>
-            """), unsafe_allow_html=True)
-            
-            # Shorter wait time for better UX
-            time.sleep(5.0)
-        
-        placeholder.empty()
-        st.session_state['splash_played'] = True
+        </div>
+        <div class="title-text">TIME HUNT AI</div>
+        <div class="subtitle-text">Focus • Execute • Achieve</div>
+    </div>
+    """), unsafe_allow_html=True)
+    return True
+
+def end_comet_splash():
+    """Renders the marker that tells the splash overlay the page is ready."""
+    st.markdown('<div class="timehunt-ready"></div>', unsafe_allow_html=True)
 
 # --- 12. AI CONTEXT GENERATOR (The "Brain Dump") ---
-def get_system_context():
+def get_system_context(inline_data=False):
     """
-    Aggregates the user's current status, schedule, and profile 
-    into a context prompt for the AI.
+    Aggregates the user's current status and profile into a context prompt
+    for the AI. The schedule and reminders are only inlined when the model
+    cannot fetch them itself through ai_tools (inline_data=True).
     """
     # 1. User Profile
     user_name = st.session_state.get('user_name', 'Achiever')
@@ -844,6 +2015,18 @@ def get_system_context():
     current_time = ist_now.strftime("%H:%M")
     current_date = ist_now.strftime("%Y-%m-%d")
     
+    if not inline_data:
+        return f"""
+    IDENTITY: You are TimeHunt AI, a wise and efficient productivity mentor.
+    USER PROFILE: {user_name} ({role}) | XP: {xp}
+    CURRENT CONTEXT: Date: {current_date} | Time: {current_time}
+    
+    === YOUR INSTRUCTIONS ===
+    1. CONTEXTUAL HELP: You cannot see the user's data up front. Call the tools (get_my_schedule, get_pending_reminders, get_app_settings, get_analytics_summary) when a question needs it, e.g. "What's next?" -> get_my_schedule.
+    2. TONE: Be polite, motivating, and sharp. Do not use military jargon. Use phrases like "Let's focus," "Great progress," or "Here is the plan."
+    3. ACCOUNTABILITY: If a task is overdue, gently remind them to clear their backlog.
+    """
+
     # 3. Schedule Awareness
     schedule_text = "No specific plans for today."
     slots = st.session_state.get('timetable_slots', [])
@@ -892,13 +2075,14 @@ def get_current_time_and_date():
     ist_now = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=5, minutes=30)))
     return ist_now.strftime("%Y-%m-%d %H:%M:%S")
 
-def get_my_schedule(date_str=None):
+def get_my_schedule(date_str=None, state=None):
     """Gets schedule for a specific date (YYYY-MM-DD) or today if none provided."""
     import datetime
+    state = st.session_state if state is None else state
     if not date_str:
         date_str = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=5, minutes=30))).strftime("%Y-%m-%d")
     
-    slots = st.session_state.get('timetable_slots', [])
+    slots = state.get('timetable_slots', [])
     todays_tasks = [s for s in slots if s.get('Date') == date_str]
     
     if not todays_tasks:
@@ -910,9 +2094,10 @@ def get_my_schedule(date_str=None):
         schedule_text += f"- [{status}] {s['Time']}: {s['Activity']} ({s['Category']})\n"
     return schedule_text
 
-def get_pending_reminders():
+def get_pending_reminders(state=None):
     """Returns a list of all active, un-notified alarms."""
-    rems = st.session_state.get('reminders', [])
+    state = st.session_state if state is None else state
+    rems = state.get('reminders', [])
     pending = [r for r in rems if not r.get('notified')]
     if not pending:
         return "No pending reminders."
@@ -922,21 +2107,23 @@ def get_pending_reminders():
         text += f"- {r['task']} at {r['time']}\n"
     return text
 
-def get_app_settings():
+def get_app_settings(state=None):
     """Returns current theme, voice, and user goal settings."""
+    state = st.session_state if state is None else state
     return f"""
     Current Settings:
-    - Theme Mode: {st.session_state.get('theme_mode')}
-    - Accent Color: {st.session_state.get('theme_color')}
-    - AI Voice: {st.session_state.get('ai_voice_style')}
-    - User Goal: {st.session_state.get('user_goal')}
+    - Theme Mode: {state.get('theme_mode')}
+    - Accent Color: {state.get('theme_color')}
+    - AI Voice: {state.get('ai_voice_style')}
+    - User Goal: {state.get('user_goal')}
     """
 
-def get_analytics_summary():
+def get_analytics_summary(state=None):
     """Returns a summary of XP, Level, and Task Completion rates."""
-    xp = st.session_state.get('user_xp', 0)
-    level = st.session_state.get('user_level', 1)
-    slots = st.session_state.get('timetable_slots', [])
+    state = st.session_state if state is None else state
+    xp = state.get('user_xp', 0)
+    level = state.get('user_level', 1)
+    slots = state.get('timetable_slots', [])
     total = len(slots)
     done = len([t for t in slots if t.get('Done')])
     rate = int((done / total * 100)) if total > 0 else 0
@@ -982,33 +2169,226 @@ ai_tools = [
     ]}
 ]
 
+# Session keys the tools read (snapshotted, since model calls run on worker threads)
+AI_TOOL_STATE_KEYS = ['timetable_slots', 'reminders', 'theme_mode', 'theme_color', 'ai_voice_style', 'user_goal', 'user_xp', 'user_level']
+AI_MAX_TOOL_ROUNDS = 4 # Model <-> tool round trips before we insist on an answer
+
 # Tool Call Handler
-def handle_tool_call(tool_call):
+def handle_tool_call(tool_call, state=None):
     fn_name = tool_call.name
-    fn_args = tool_call.args
-    
-    if fn_name == "get_current_time_and_date":
-        return get_current_time_and_date()
-    elif fn_name == "get_my_schedule":
-        return get_my_schedule(**fn_args)
-    elif fn_name == "get_pending_reminders":
-        return get_pending_reminders()
-    elif fn_name == "get_app_settings":
-        return get_app_settings()
-    elif fn_name == "get_analytics_summary":
-        return get_analytics_summary()
+    fn_args = dict(tool_call.args or {})
+    
+    try:
+        if fn_name == "get_current_time_and_date":
+            return get_current_time_and_date()
+        elif fn_name == "get_my_schedule":
+            return get_my_schedule(date_str=fn_args.get("date_str"), state=state)
+        elif fn_name == "get_pending_reminders":
+            return get_pending_reminders(state=state)
+        elif fn_name == "get_app_settings":
+            return get_app_settings(state=state)
+        elif fn_name == "get_analytics_summary":
+            return get_analytics_summary(state=state)
+    except Exception as e:
+        return f"Tool error: {e}"
     return "Tool not found."
 
+def tool_response_parts(function_calls, state):
+    """Runs the model's requested tools and wraps the results for the next turn."""
+    from google.genai import types
+    return [
+        types.Part.from_function_response(name=fc.name, response={"result": handle_tool_call(fc, state)})
+        for fc in function_calls
+    ]
+
 # --- 13. AI ANALYSIS ENGINE ----
+AI_HISTORY_TOKEN_BUDGET = 3000 # Recent chat turns sent verbatim, newest first, up to this many tokens
+AI_MESSAGE_TOKEN_CAP = 1500    # A single pasted document can't take the whole budget
+AI_SUMMARY_BATCH = 4           # Re-summarise once this many turns have left the verbatim window
+AI_GAP_MESSAGE_TOKENS = 300     # Turns that left the window but aren't summarised yet are sent this short
+AI_SUMMARY_MODEL = "gemini-2.0-flash-lite"
+
+def estimate_tokens(text):
+    """Cheap local estimate (~4 characters per token) - no count_tokens round trip."""
+    return max(1, len(text) // 4)
+
+def clip_to_tokens(text, max_tokens):
+    """Keeps the head and tail of an oversized message."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    chars = max_tokens * 4
+    return text[:chars * 2 // 3] + "\n[...]\n" + text[-(chars // 3):]
+
+class ChatSummaryStore:
+    """
+    Rolling summaries of the older part of each chat session, shared process-wide.
+    Each entry covers messages [0, upto); updates run in the background and
+    only one per session is in flight at a time.
+    """
+    def __init__(self):
+        self._summaries = TTLCache(ttl=24 * 3600, max_entries=5000)
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        return self._summaries.get(session_id) or {"upto": 0, "text": ""}
+
+    def refresh(self, session_id, entry, evicted, upto, api_keys):
+        with self._lock:
+            if session_id in self._inflight:
+                return
+            self._inflight.add(session_id)
+
+        transcript = "\n".join(
+            f"{'User' if m.get('role') == 'user' else 'TimeHunt AI'}: {clip_to_tokens(m['text'], 300)}"
+            for m in evicted
+        )
+        prompt = (
+            "Update the running summary of a conversation between a user and their productivity assistant. "
+            "Keep facts, decisions, plans, names and open questions; drop pleasantries. Max 150 words.\n\n"
+            f"CURRENT SUMMARY:\n{entry['text'] or '(none)'}\n\nNEW MESSAGES:\n{transcript}"
+        )
+
+        def job():
+            from google.genai import types
+            pool = get_gemini_pool()
+            try:
+                for key in pool.ordered_keys(api_keys, AI_SUMMARY_MODEL):
+                    try:
+                        response = pool.client(key).models.generate_content(
+                            model=AI_SUMMARY_MODEL, contents=prompt,
+                            config=types.GenerateContentConfig(temperature=0.2, max_output_tokens=400)
+                        )
+                        pool.report_success(key, AI_SUMMARY_MODEL)
+                        if response.text:
+                            self._summaries.set(session_id, {"upto": upto, "text": response.text.strip()})
+                        return
+                    except Exception as e:
+                        pool.report_failure(key, AI_SUMMARY_MODEL, e)
+            finally:
+                with self._lock:
+                    self._inflight.discard(session_id)
+
+        get_ai_executor().submit(job)
+
+@st.cache_resource(show_spinner=False)
+def get_chat_summaries():
+    return ChatSummaryStore()
+
+GEMINI_FILE_EXPIRY_MARGIN = 3600 # Re-upload an hour before Gemini deletes the file (~48h)
 
-def perform_ai_analysis(user_query, file_data=None, file_type=None, enable_search=False):
+class GeminiFileCache:
+    """
+    Content hash -> file already uploaded to the Gemini Files API, so follow-up
+    questions about the same document reuse it instead of re-uploading.
+    Uploads go straight from memory. Files belong to the key's project, so a
+    document may be uploaded once per key that needs it (see owners()).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}        # sha256 -> {key: {"file", "uri", "key", "mime_type", "expires_at"}}
+        self._upload_locks = {} # sha256 -> Lock (two reruns never upload the same bytes twice)
+
+    def _prune(self):
+        now = time.time()
+        for digest in list(self._files):
+            live = {k: e for k, e in self._files[digest].items() if e["expires_at"] > now}
+            if live:
+                self._files[digest] = live
+            else:
+                self._files.pop(digest, None)
+                self._upload_locks.pop(digest, None)
+
+    def owners(self, data):
+        """Keys that currently hold an unexpired copy of these bytes."""
+        digest = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            return {k for k, e in self._files.get(digest, {}).items() if e["expires_at"] > now}
+
+    def get_or_upload(self, data, mime_type, api_keys, pool=None):
+        """
+        A live upload owned by one of api_keys (in that order), or a new upload
+        under the healthiest of them. Pass a single key to get that key's copy.
+        """
+        import io
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._prune()
+            upload_lock = self._upload_locks.setdefault(digest, threading.Lock())
+
+        with upload_lock:
+            copies = self._files.get(digest, {})
+            for key in api_keys:
+                entry = copies.get(key)
+                if entry and entry["expires_at"] > time.time():
+                    return entry
+
+            pool = pool or get_gemini_pool()
+            last_error = None
+            for key in pool.ordered_keys(api_keys):
+                try:
+                    file_ref = pool.client(key).files.upload(file=io.BytesIO(data), config={'mime_type': mime_type})
+                except Exception as e:
+                    pool.report_failure(key, None, e)
+                    last_error = e
+                    continue
+                expires = file_ref.expiration_time.timestamp() if file_ref.expiration_time else time.time() + 47 * 3600
+                entry = {
+                    "file": file_ref, "uri": file_ref.uri, "key": key, "mime_type": mime_type,
+                    "expires_at": expires - GEMINI_FILE_EXPIRY_MARGIN
+                }
+                with self._lock:
+                    self._files.setdefault(digest, {})[key] = entry
+                return entry
+            raise last_error or RuntimeError("No API key available for upload")
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_files():
+    return GeminiFileCache()
+
+def build_chat_context(history, session_id=None, api_keys=()):
+    """
+    Token-budgeted history: the newest turns verbatim (up to AI_HISTORY_TOKEN_BUDGET),
+    plus the cached summary of everything older. Turns that have left the window
+    but aren't in the summary yet are still sent, clipped to AI_GAP_MESSAGE_TOKENS,
+    so nothing drops out while a summary is pending. Returns (recent_messages, summary_text).
+    """
+    msgs = [m for m in history if m.get('text')]
+    used, start = 0, len(msgs)
+    for i in range(len(msgs) - 1, -1, -1):
+        cost = min(estimate_tokens(msgs[i]['text']), AI_MESSAGE_TOKEN_CAP)
+        if used + cost > AI_HISTORY_TOKEN_BUDGET:
+            break
+        used += cost
+        start = i
+    recent = [dict(m, text=clip_to_tokens(m['text'], AI_MESSAGE_TOKEN_CAP)) for m in msgs[start:]]
+
+    summary = ""
+    if session_id and start > 0:
+        store = get_chat_summaries()
+        entry = store.get(session_id)
+        summary = entry["text"]
+        # The previous summary is used meanwhile; the fresh one lands on a later turn
+        if not summary or start - entry["upto"] >= AI_SUMMARY_BATCH:
+            store.refresh(session_id, entry, msgs[entry["upto"]:start], start, list(api_keys))
+        gap = msgs[min(entry["upto"], start):start]
+        recent = [dict(m, text=clip_to_tokens(m['text'], AI_GAP_MESSAGE_TOKENS)) for m in gap] + recent
+    return recent, summary
+
+def perform_ai_analysis(user_query, file_data=None, file_type=None, enable_search=False, stream=False,
+                        cacheable=False, cache_context=""):
     """
     Handles AI requests with FORCED identity injection and 2026 Model List.
+    With stream=True the reply is returned as a generator of text chunks
+    (see stream_ai_analysis); error messages and cache hits stay plain strings.
+    cacheable=True lets identical prompts reuse a recent reply. Only set it for
+    prompts that do not depend on the chat, and pass whatever user data the
+    answer does depend on as cache_context.
     """
     try:
         from google import genai
         from google.genai import types
-        import io
     except ImportError:
         return "⚠️ System Error: `google-genai` library missing.", "System"
 
@@ -1016,6 +2396,14 @@ def perform_ai_analysis(user_query, file_data=None, file_type=None, enable_searc
     if not api_keys:
         return "⚠️ Auth Error: No API Keys found.", "System"
 
+    # --- 0. RESPONSE CACHE (opt-in) ---
+    cache_key = None
+    if cacheable:
+        cache_key = ai_cache_key(user_query, cache_context, file_data, enable_search)
+        cached = get_ai_response_cache().get(cache_key)
+        if cached is not None:
+            return cached, "TimeHunt AI"
+
     # --- 1. THE FIX: Identity Injection ---
     # We append this to the query so the model CANNOT ignore it.
     identity_enforcer = (
@@ -1031,69 +2419,208 @@ def perform_ai_analysis(user_query, file_data=None, file_type=None, enable_searc
     final_query = user_query + identity_enforcer if user_query else ""
 
     # --- 2. CONFIGURATION ---
-    # We also pass it here for double enforcement
-    sys_instruction_text = get_system_context() 
+    # We also pass it here for double enforcement.
+    # Gemini can't mix Google Search with function calling, so search requests
+    # get the data inlined; everything else fetches it through ai_tools on demand.
+    sys_instruction_text = get_system_context(inline_data=enable_search) 
+
+    # Chat memory: recent turns verbatim + rolling summary of older ones.
+    # The message being answered is already in chat_history; it is sent as the new turn instead.
+    past = list(st.session_state.get('chat_history', []))
+    if past and past[-1].get('role') == "user" and past[-1].get('text') in (user_query, "🎤 [Voice]"):
+        past = past[:-1]
+    recent_msgs, summary = build_chat_context(past, st.session_state.get('current_session_id'), api_keys)
+    if summary:
+        sys_instruction_text += f"\n    === EARLIER IN THIS CHAT (summary) ===\n    {summary}\n"
     generate_config = types.GenerateContentConfig(
         system_instruction=sys_instruction_text,
         temperature=0.7,
-        max_output_tokens=4000
+        max_output_tokens=4000,
+        tools=None if enable_search else ai_tools,
+        automatic_function_calling=types.AutomaticFunctionCallingConfig(disable=True)
     )
 
     if enable_search:
         try: generate_config.tools = [types.Tool(google_search=types.GoogleSearch())]
         except: pass
+    tool_state = {k: st.session_state.get(k) for k in AI_TOOL_STATE_KEYS}
+    # For the last tool round: tools stay declared (history has calls) but may not be called again
+    answer_only_config = generate_config.model_copy(update={
+        "tool_config": types.ToolConfig(function_calling_config=types.FunctionCallingConfig(mode="NONE"))
+    })
 
     # --- 3. PREPARE CONTENT ---
     user_content_parts = []
     if final_query:
         user_content_parts.append(types.Part.from_text(text=final_query))
     
+    pool = get_gemini_pool()
+    gemini_files = get_gemini_files()
+    file_part_index = None
+    file_owners = set()
     if file_data and file_type:
         try:
             if file_type.startswith("image/") or file_type.startswith("audio/"):
                 user_content_parts.append(types.Part.from_bytes(data=file_data, mime_type=file_type))
             elif file_type == "application/pdf":
-                client_temp = genai.Client(api_key=api_keys[0])
-                file_ref = client_temp.files.upload(file=io.BytesIO(file_data), config={'mime_type': 'application/pdf'})
-                user_content_parts.append(types.Part.from_uri(uri=file_ref.uri, mime_type=file_type))
+                # Uploaded once per document; follow-up questions reuse the same file URI
+                uploaded = gemini_files.get_or_upload(file_data, file_type, api_keys, pool=pool)
+                file_owners = gemini_files.owners(file_data)
+                file_part_index = len(user_content_parts)
+                user_content_parts.append(types.Part.from_uri(file_uri=uploaded["uri"], mime_type=file_type))
         except Exception as e:
             return f"⚠️ File Error: {e}", "System"
 
     if not user_content_parts: return "⚠️ No content.", "System"
 
     # --- 4. EXECUTION LOOP (UPDATED 2026 MODELS) ---
-    models_to_try = [
-        "gemini-2.5-flash",          # 🚀 TOP TIER: Best reasoning
-        "gemini-2.0-flash",          # 🛡️ STABLE: Reliable fallback
-        "gemini-2.0-flash-lite",     # ⚡ SPEED: Ultra-fast fallback
+    models_to_try = GEMINI_MODELS
+    # Built here: worker threads cannot read st.session_state
+    history = [
+        types.Content(
+            role="user" if msg['role'] == "user" else "model", 
+            parts=[types.Part.from_text(text=msg['text'])]
+        )
+        for msg in recent_msgs
     ]
 
-    for model_name in models_to_try:
-        for key in api_keys:
-            if not isinstance(key, str): continue
+    def content_parts_for(key):
+        """The request parts as seen by `key` (an uploaded file is only visible to its owner)."""
+        if file_part_index is None:
+            return user_content_parts
+        # Re-uploads under this key if it doesn't hold a copy yet (e.g. the owner is throttled)
+        uploaded = gemini_files.get_or_upload(file_data, file_type, [key], pool=pool)
+        parts = list(user_content_parts)
+        parts[file_part_index] = types.Part.from_uri(file_uri=uploaded["uri"], mime_type=file_type)
+        return parts
+
+    def attempt(model_name, key):
+        def call():
             try:
-                client = genai.Client(api_key=key)
-                
-                chat = client.chats.create(
-                    model=model_name,
-                    config=generate_config,
-                    history=[
-                        types.Content(
-                            role="user" if msg['role'] == "user" else "model", 
-                            parts=[types.Part.from_text(text=msg['text'])]
-                        )
-                        for msg in st.session_state.get('chat_history', [])[-6:]
-                        if msg.get('text')
-                    ]
-                )
-                
-                response = chat.send_message(user_content_parts)
-                return response.text, "TimeHunt AI"
-
+                message = content_parts_for(key)
+                chat = pool.client(key).chats.create(model=model_name, config=generate_config, history=history)
+                response = chat.send_message(message)
+                # Function-calling loop: answer tool requests until the model replies in text
+                for round_no in range(AI_MAX_TOOL_ROUNDS):
+                    if not response.function_calls:
+                        break
+                    config = answer_only_config if round_no == AI_MAX_TOOL_ROUNDS - 1 else None
+                    response = chat.send_message(tool_response_parts(response.function_calls, tool_state), config=config)
+                if response.function_calls or not response.text:
+                    raise RuntimeError("No text reply") # Lets the next model/key try
+                pool.report_success(key, model_name)
+                return response.text
             except Exception as e:
-                continue 
+                pool.report_failure(key, model_name, e)
+                raise
+        return call
+
+    # Healthy keys first; keys cooling down after a 429 are skipped.
+    # Keys that already hold the uploaded file go before ones that would re-upload it.
+    candidates = [
+        (model_name, key)
+        for model_name in models_to_try
+        for key in sorted(pool.ordered_keys(api_keys, model_name), key=lambda k: k not in file_owners)
+    ]
+
+    if stream:
+        def stream_reply(model_name, key):
+            """Text chunks from one model/key, answering tool requests in between."""
+            message = content_parts_for(key)
+            chat = pool.client(key).chats.create(model=model_name, config=generate_config, history=history)
+            for round_no in range(AI_MAX_TOOL_ROUNDS + 1):
+                config = answer_only_config if round_no == AI_MAX_TOOL_ROUNDS else None
+                calls = []
+                for chunk in chat.send_message_stream(message, config=config):
+                    if chunk.function_calls:
+                        calls.extend(chunk.function_calls)
+                    if chunk.text:
+                        yield chunk.text
+                if not calls:
+                    return
+                # The model asked for data: run the tools and stream its follow-up
+                message = tool_response_parts(calls, tool_state)
+
+        def first_token(model_name, key):
+            # Runs on the AI executor until the first chunk, so run_hedged can race and time it out
+            def call():
+                chunks = stream_reply(model_name, key)
+                try:
+                    first = next(chunks)
+                except StopIteration:
+                    error = RuntimeError("Empty response")
+                    pool.report_failure(key, model_name, error)
+                    raise error
+                except Exception as e:
+                    pool.report_failure(key, model_name, e)
+                    raise
+                return first, chunks, model_name, key
+            return call
+
+        def stream_chunks():
+            # Fails over (hedged, within AI_REQUEST_BUDGET) only until the first token arrives
+            started = time.time()
+            try:
+                first, chunks, model_name, key = run_hedged([first_token(m, k) for m, k in candidates])
+            except Exception:
+                get_ai_metrics().record("ttft", time.time() - started, ok=False)
+                yield "⚠️ AI Unavailable. Please check API Quota."
+                return
+            get_ai_metrics().record("ttft", time.time() - started)
+
+            parts = [first]
+            yield first
+
+            # The rest is read by a thread of its own, so a busy AI executor can't look like a stall
+            from queue import Queue
+            feed = Queue()
+            def read_rest():
+                try:
+                    for chunk in chunks:
+                        feed.put(("chunk", chunk))
+                    feed.put(("done", None))
+                except Exception as e:
+                    feed.put(("error", e))
+            threading.Thread(target=read_rest, name="gemini-stream", daemon=True).start()
 
-    return "⚠️ AI Unavailable. Please check API Quota.", "System"
+            try:
+                while True:
+                    # A stalled stream ends the reply instead of blocking the render
+                    kind, value = feed.get(timeout=AI_STREAM_STALL)
+                    if kind == "done":
+                        break
+                    if kind == "error":
+                        raise value
+                    parts.append(value)
+                    yield value
+            except Exception as e:
+                pool.report_failure(key, model_name, e)
+                yield "\n\n⚠️ Response interrupted."
+                return
+            pool.report_success(key, model_name)
+            if cache_key:
+                get_ai_response_cache().set(cache_key, "".join(parts))
+        return stream_chunks(), "TimeHunt AI"
+
+    # A slow primary gets raced by the next model/key after AI_HEDGE_DELAY.
+    started = time.time()
+    try:
+        response_text = run_hedged([attempt(m, k) for m, k in candidates])
+        get_ai_metrics().record("response", time.time() - started)
+        if cache_key and response_text:
+            get_ai_response_cache().set(cache_key, response_text)
+        return response_text, "TimeHunt AI"
+    except Exception:
+        get_ai_metrics().record("response", time.time() - started, ok=False)
+        return "⚠️ AI Unavailable. Please check API Quota.", "System"
+
+def stream_ai_analysis(user_query, file_data=None, file_type=None, enable_search=False, **cache_args):
+    """Chunks of the AI reply for st.write_stream (errors and cache hits arrive as a single chunk)."""
+    reply, _ = perform_ai_analysis(user_query, file_data, file_type, enable_search, stream=True, **cache_args)
+    if isinstance(reply, str):
+        yield reply
+    else:
+        yield from reply
 
 # --- 14. REMINDER CHECKER (Browser Notifications) ---
 def check_reminders():
@@ -1115,7 +2642,7 @@ def check_reminders():
     now = datetime.datetime.now()
     reminders = st.session_state.get('reminders', [])
     
-    for i, rem in enumerate(reminders):
+    for rem in reminders:
         # Convert string time to object if needed
         if isinstance(rem['time'], str):
             try:
@@ -1124,8 +2651,9 @@ def check_reminders():
 
         # Check Trigger
         if not rem['notified'] and now >= rem['time']:
-            # Set Active Alarm
-            st.session_state['active_alarm'] = {'task': rem['task'], 'index': i}
+            # Set Active Alarm (addressed by ID, not list index)
+            rem.setdefault('id', str(uuid.uuid4()))
+            st.session_state['active_alarm'] = {'task': rem['task'], 'id': rem['id']}
             rem['notified'] = True 
             sync_data()
             
@@ -1145,128 +2673,282 @@ def check_reminders():
 # --- generate_visual_intel function---
 
 # --- MASTER HYBRID GENERATOR (Hugging Face + Pollinations Fallback) ---
-def generate_visual_intel(prompt_text):
+IMAGE_ASSET_DIR = os.path.join(LOCAL_DATA_DIR, "images")
+IMAGE_THUMB_WIDTH = 512 # Chat history shows thumbnails; the full image is only shown once
+IMAGE_ASSET_MAX_BYTES = int(os.environ.get("IMAGE_ASSET_MAX_BYTES", 500 * 1024 * 1024)) # Least recently viewed images are evicted past this
+
+class ImageAssetStore:
     """
-    1. Tries Hugging Face Official (Best Quality, High Limits)
-    2. If that fails, auto-switches to Pollinations Flux (Backup)
-    3. Adds Watermark
-    Returns: Base64 String of the final image.
+    Generated images stored once on disk under content-hash IDs ("img:<sha>").
+    Each asset has a full JPEG (also what Drive receives) and a WebP thumbnail.
+    Session state and chat rows hold only the ID; st.image gets a file path.
+    The folder is capped at max_bytes; the least recently viewed images go first
+    (chat rows normally point at the Drive copy, so this is a local cache).
     """
-    import base64
+    PREFIX = "img:"
+
+    def __init__(self, root=IMAGE_ASSET_DIR, max_bytes=IMAGE_ASSET_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, asset_id, thumb=False):
+        digest = str(asset_id)[len(self.PREFIX):]
+        if not re.fullmatch(r"[0-9a-f]{16,64}", digest):
+            return None
+        return os.path.join(self.root, f"{digest}_thumb.webp" if thumb else f"{digest}.jpg")
+
+    def put(self, image):
+        """Saves a PIL image (idempotent) and returns its asset ID."""
+        import io
+        from PIL import Image
+        image = image.convert("RGB")
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG", quality=90, optimize=True)
+        data = buffered.getvalue()
+
+        asset_id = self.PREFIX + hashlib.sha256(data).hexdigest()[:32]
+        full_path = self._path(asset_id)
+        if not os.path.exists(full_path):
+            tmp_path = f"{full_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, full_path)
+
+            thumb = image.copy()
+            thumb.thumbnail((IMAGE_THUMB_WIDTH, IMAGE_THUMB_WIDTH), Image.Resampling.LANCZOS)
+            thumb.save(self._path(asset_id, thumb=True), format="WEBP", quality=80)
+            with self._lock:
+                self._evict(keep=asset_id)
+        return asset_id
+
+    def _evict(self, keep=None):
+        """Deletes whole assets (full image + thumbnail), oldest mtime first, until under max_bytes."""
+        assets = {} # digest -> [newest mtime, total size, paths]
+        for name in os.listdir(self.root):
+            if not (name.endswith(".jpg") or name.endswith("_thumb.webp")):
+                continue
+            full = os.path.join(self.root, name)
+            try:
+                stat = os.stat(full)
+            except OSError:
+                continue
+            entry = assets.setdefault(name.split(".")[0].split("_")[0], [0, 0, []])
+            entry[0] = max(entry[0], stat.st_mtime)
+            entry[1] += stat.st_size
+            entry[2].append(full)
+
+        total = sum(size for _, size, _ in assets.values())
+        keep_digest = str(keep or "")[len(self.PREFIX):]
+        for digest, (_, size, paths) in sorted(assets.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if digest == keep_digest:
+                continue
+            for full in paths:
+                try:
+                    os.remove(full)
+                except OSError:
+                    pass
+            total -= size
+
+    def path(self, asset_id, thumb=False):
+        """File path for st.image, or None if the asset isn't on this server."""
+        path = self._path(asset_id, thumb)
+        if path and thumb and not os.path.exists(path):
+            path = self._path(asset_id) # Thumbnail missing: fall back to the full image
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            os.utime(path) # Recently viewed: survives eviction longer
+        except OSError:
+            pass
+        return path
+
+    def read(self, asset_id):
+        path = self.path(asset_id)
+        if not path:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+@st.cache_resource(show_spinner=False)
+def get_image_store():
+    return ImageAssetStore()
+
+def render_chat_image(image_ref, thumb=True):
+    """Shows a chat image by reference: asset ID, Drive link, or (legacy) inline base64."""
+    ref = str(image_ref or "")
+    try:
+        if ref.startswith(ImageAssetStore.PREFIX):
+            path = get_image_store().path(ref, thumb=thumb)
+            if path: st.image(path)
+            else: st.caption("🖼️ Image no longer available on this server.")
+        elif ref.startswith("http"):
+            st.image(ref)
+        elif ref:
+            st.image(base64.b64decode(ref))
+    except Exception:
+        pass
+
+IMAGE_BACKUP_DELAY = float(os.environ.get("IMAGE_BACKUP_DELAY", 3)) # Start the second provider if the first is silent this long (<= 0: only after it fails)
+IMAGE_GEN_BUDGET = 40 # Seconds before giving up on every provider
+
+def _image_from_hf(prompt_text, hf_token):
+    from huggingface_hub import InferenceClient
+    client = InferenceClient(token=hf_token)
+    # Using a fast, reliable model (Stable Diffusion v1.5)
+    # You can change this to "stabilityai/stable-diffusion-2-1" for different styles
+    return client.text_to_image(
+        f"{prompt_text}, cinematic lighting, highly detailed, 8k, masterpiece",
+        model="runwayml/stable-diffusion-v1-5"
+    )
+
+def _image_from_pollinations(prompt_text):
     import io
     import random
     import requests
-    from PIL import Image, ImageDraw, ImageFont
-    from huggingface_hub import InferenceClient
+    from urllib.parse import quote
+    from PIL import Image
+    # We add a random seed to prevent caching old images
+    seed = random.randint(1, 99999)
+    # Added 'nologo=true' and 'enhance=true'
+    url = f"https://image.pollinations.ai/prompt/{quote(prompt_text)}?model=flux&width=1024&height=768&seed={seed}&nologo=true&enhance=true"
+    response = requests.get(url, timeout=15)
+    if response.status_code != 200:
+        raise RuntimeError(f"Pollinations status {response.status_code}")
+    image = Image.open(io.BytesIO(response.content))
+    image.load() # Reject truncated / non-image bodies here, not at watermark time
+    return image
+
+def rank_image_providers(names):
+    """Orders providers by recent success rate, then median latency (unknown ones keep their place)."""
+    stats = get_ai_metrics()
+    def score(indexed):
+        position, name = indexed
+        summary = stats.summary(f"image:{name}")
+        if not summary:
+            return (0, 0, position)
+        total = summary["count"] + summary["failed"]
+        failure_rate = round(summary["failed"] / total, 1) if total else 0
+        return (failure_rate, summary["p50"] if summary["p50"] is not None else IMAGE_GEN_BUDGET, position)
+    return [name for _, name in sorted(enumerate(names), key=score)]
 
-    # --- 1. TRY HUGGING FACE (OFFICIAL) ---
-    try:
-        # Check for Token
-        hf_token = st.secrets.get("HF_TOKEN")
-        if not hf_token:
-            # This warning will show in your app if the token is missing
-            st.warning("⚠️ HF_TOKEN missing in secrets.toml. Switching to backup generator.")
-            raise ValueError("Missing HF_TOKEN")
-
-        client = InferenceClient(token=hf_token)
-        
-        # Using a fast, reliable model (Stable Diffusion v1.5)
-        # You can change this to "stabilityai/stable-diffusion-2-1" for different styles
-        image = client.text_to_image(
-            f"{prompt_text}, cinematic lighting, highly detailed, 8k, masterpiece",
-            model="runwayml/stable-diffusion-v1-5"
-        )
-        
-        # If successful, apply watermark and return
-        return apply_watermark(image)
-            
-    except Exception as e:
-        # ⚠️ DIAGNOSTIC: This prints the specific error to your app console/UI
-        # So you know WHY Hugging Face failed (Auth error? Quota? Internet?)
-        print(f"⚠️ Primary AI Failed: {e}") 
-        # Optional: Uncomment the next line to see the error on the app screen for debugging
-        # st.error(f"Hugging Face Error: {e}")
+def generate_visual_intel(prompt_text):
+    """
+    Races Hugging Face (best quality) and Pollinations Flux: the preferred
+    provider starts first, the other joins if it fails or is silent for
+    IMAGE_BACKUP_DELAY, and the first valid image wins. Each provider's
+    latency and success are recorded and decide the order next time.
+    Returns: asset ID of the final (watermarked) image in the image store.
+    """
+    providers = {"pollinations": lambda: _image_from_pollinations(prompt_text)}
+
+    # Check for Token
+    hf_token = st.secrets.get("HF_TOKEN")
+    if hf_token:
+        providers["hf"] = lambda: _image_from_hf(prompt_text, hf_token)
+    else:
+        # This warning will show in your app if the token is missing
+        st.warning("⚠️ HF_TOKEN missing in secrets.toml. Switching to backup generator.")
 
-    # --- 2. FALLBACK: POLLINATIONS.AI (FLUX) ---
+    stats = get_ai_metrics()
+    def timed(name):
+        def call():
+            started = time.time()
+            try:
+                image = providers[name]()
+            except Exception as e:
+                stats.record(f"image:{name}", time.time() - started, ok=False)
+                # ⚠️ DIAGNOSTIC: So you know WHY a provider failed (Auth error? Quota? Internet?)
+                print(f"⚠️ Image provider {name} failed: {e}")
+                raise
+            stats.record(f"image:{name}", time.time() - started)
+            return image
+        return call
+
+    order = rank_image_providers([n for n in ("hf", "pollinations") if n in providers])
     try:
-        # We add a random seed to prevent caching old images
-        seed = random.randint(1, 99999)
-        # Added 'nologo=true' and 'enhance=true'
-        url = f"https://image.pollinations.ai/prompt/{prompt_text}?model=flux&width=1024&height=768&seed={seed}&nologo=true&enhance=true"
-        
-        response = requests.get(url, timeout=15)
-        if response.status_code == 200:
-            image = Image.open(io.BytesIO(response.content))
-            return apply_watermark(image)
-        else:
-            st.error(f"Backup Gen Failed: Status {response.status_code}")
-            
+        image = run_hedged([timed(name) for name in order], hedge_delay=IMAGE_BACKUP_DELAY, budget=IMAGE_GEN_BUDGET)
+        return get_image_store().put(apply_watermark(image))
     except Exception as e:
         st.error(f"❌ All AI Models Failed. Error: {e}")
         return None
 
-    return None
+@st.cache_resource(show_spinner=False)
+def get_watermark_source():
+    """
+    watermark.png decoded once per process (RGBA), or None. Always the
+    original: a pre-shrunk copy would change the LANCZOS result per image.
+    """
+    from PIL import Image
+    path = "watermark.png"
+    if not os.path.exists(path):
+        return None
+    with Image.open(path) as logo:
+        return logo.convert("RGBA")
+
+@st.cache_resource(show_spinner=False)
+def get_watermark_overlay(target_width):
+    """
+    The logo prepared for compositing at one width, cached per width:
+    (RGB pre-multiplied by alpha, 1 - alpha) as float32 arrays, or None.
+    """
+    from PIL import Image
+    logo = get_watermark_source()
+    if logo is None:
+        return None
+
+    # Resize maintaining aspect ratio
+    new_logo_height = int(target_width * logo.height / logo.width)
+    logo = logo.resize((target_width, new_logo_height), Image.Resampling.LANCZOS)
+
+    # Transparency (Glass Effect): any visible pixel becomes alpha 180
+    rgba = np.asarray(logo, dtype=np.float32)
+    alpha = np.where(rgba[..., 3:] > 0, 180 / 255, 0).astype(np.float32)
+    return rgba[..., :3] * alpha, 1.0 - alpha
 
 def apply_watermark(image):
     """
-    Applies a TINY watermark (Gemini Style) and returns Base64 string.
+    Applies a TINY watermark (Gemini Style) and returns the RGB PIL image.
+    The logo comes pre-sized and pre-multiplied from get_watermark_overlay, so
+    each image only pays for one NumPy blend over the logo's corner.
     """
-    import io
-    import base64
     from PIL import Image
     
     try:
-        main_img = image.convert("RGBA")
+        main_img = image.convert("RGB")
         width, height = main_img.size
         
-        # Try to load local watermark.png
-        try:
-            logo = Image.open("watermark.png").convert("RGBA")
-            
-            # 1. Target only 10% of the total image width
-            target_width = int(width * 0.10)
-            if target_width > 100: target_width = 100
-            if target_width < 40: target_width = 40
-            
-            # 2. Resize maintaining aspect ratio
-            aspect_ratio = logo.height / logo.width
-            new_logo_height = int(target_width * aspect_ratio)
-            logo = logo.resize((target_width, new_logo_height), Image.Resampling.LANCZOS)
-            
-            # 3. Transparency (Glass Effect)
-            logo_data = logo.getdata()
-            new_data = []
-            for item in logo_data:
-                # If pixel has color, reduce alpha to 180 (translucent)
-                if item[3] > 0:
-                    new_data.append((item[0], item[1], item[2], 180)) 
-                else:
-                    new_data.append(item)
-            logo.putdata(new_data)
+        # 1. Target only 10% of the total image width
+        target_width = int(width * 0.10)
+        if target_width > 100: target_width = 100
+        if target_width < 40: target_width = 40
+
+        overlay = get_watermark_overlay(target_width)
+        if overlay is not None:
+            premultiplied, inverse_alpha = overlay
+            logo_h, logo_w = inverse_alpha.shape[:2]
 
-            # 4. Position: Bottom Right
+            # 2. Position: Bottom Right
             padding = 20
-            logo_x = width - target_width - padding
-            logo_y = height - new_logo_height - padding
-            
-            # Paste
-            main_img.paste(logo, (logo_x, logo_y), logo)
+            logo_x = width - logo_w - padding
+            logo_y = height - logo_h - padding
 
-        except FileNotFoundError:
-            pass # Skip if no logo file found
+            if logo_x >= 0 and logo_y >= 0:
+                pixels = np.array(main_img)
+                region = pixels[logo_y:logo_y + logo_h, logo_x:logo_x + logo_w].astype(np.float32)
+                blended = region * inverse_alpha + premultiplied
+                pixels[logo_y:logo_y + logo_h, logo_x:logo_x + logo_w] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+                main_img = Image.fromarray(pixels)
 
-        # Save to Buffer as Base64
-        final_img = main_img.convert("RGB")
-        buffered = io.BytesIO()
-        final_img.save(buffered, format="JPEG", quality=95)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return main_img
 
     except Exception as e:
         print(f"Watermark Error: {e}")
         # Fallback to original image on error
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        return image.convert("RGB")
 
 # --- 6. PAGE: ONBOARDING (User Login & Setup) ---
 
@@ -1277,21 +2959,15 @@ def page_onboarding():
     """
     
     # 1. Background Setup
-    bg_base64 = None
-    try:
-        if os.path.exists("background_small.jpg"):
-            with open("background_small.jpg", "rb") as image_file:
-                bg_base64 = base64.b64encode(image_file.read()).decode()
-    except Exception: 
-        pass
+    bg_url = get_static_assets().url(media_path("background_small.jpg", "background"))
 
     # Apply Background CSS (Fixed Double Braces for f-string)
-    if bg_base64:
+    if bg_url:
         st.markdown(f"""
         <style>
             .fixed-bg {{
                 position: fixed; top: 0; left: 0; width: 100vw; height: 100vh;
-                background-image: linear-gradient(rgba(0,0,0,0.7), rgba(0,0,0,0.9)), url("data:image/jpeg;base64,{bg_base64}");
+                background-image: linear-gradient(rgba(0,0,0,0.7), rgba(0,0,0,0.9)), url("{bg_url}");
                 background-size: cover; z-index: -1;
             }}
             .stApp {{ background: transparent !important; }} 
@@ -1370,43 +3046,31 @@ def page_onboarding():
                 if name_input and len(pin_input) >= 1:
                     with st.spinner("Authenticating..."):
                         try:
-                            from streamlit_gsheets import GSheetsConnection
-                            conn = st.connection("gsheets", type=GSheetsConnection)
-                            df = conn.read(worksheet="Sheet1", ttl=0)
+                            row = find_user_by_name(name_input)
                             
-                            if not df.empty and 'Name' in df.columns:
-                                df['PIN'] = df['PIN'].astype(str).replace(r'\.0$', '', regex=True).str.zfill(4)     
-                                existing_user = df[df['Name'] == name_input]
-                                if not existing_user.empty:
-                                    stored_pin = str(existing_user.iloc[0]['PIN']).strip()
-                                    if str(pin_input) == stored_pin:
-                                        row = existing_user.iloc[0]
-                                        st.session_state['user_name'] = row['Name']
-                                        st.session_state['user_id'] = row['UserID']
-                                        st.session_state['user_xp'] = int(row['XP'])
-                                        st.session_state['user_level'] = (st.session_state['user_xp'] // 500) + 1
-                                        st.session_state['current_objective'] = clean_text(row.get('MainFocus'), 'Finish Tasks')
-                                        st.session_state['theme_mode'] = clean_text(row.get('ThemeMode'), 'Light')
-                                        st.session_state['theme_color'] = clean_text(row.get('ThemeColor'), 'Green (Default)')
-                                        st.session_state['ai_voice_style'] = clean_text(row.get('AIVoice'), 'Jarvis (US)')
-                                        st.session_state['onboarding_complete'] = True
-                                        st.toast(f"Welcome back, {name_input}!", icon="👋")
-                                        load_cloud_data()
-                                        time.sleep(1.0) 
-                                        st.rerun()
-                                    else:
-                                        st.error("Incorrect PIN.")
-                                else:
-                                    st.session_state['user_name'] = name_input
-                                    st.session_state['temp_pin'] = pin_input
-                                    st.session_state['onboarding_step'] = 2
-                                    st.success("Username Available.")
-                                    time.sleep(1.0)
+                            if row is not None:
+                                if str(pin_input) == row['PIN']:
+                                    st.session_state['user_name'] = row['Name']
+                                    st.session_state['user_id'] = row['UserID']
+                                    st.session_state['user_xp'] = int(float(row['XP'] or 0))
+                                    st.session_state['user_level'] = (st.session_state['user_xp'] // 500) + 1
+                                    st.session_state['current_objective'] = clean_text(row.get('MainFocus'), 'Finish Tasks')
+                                    st.session_state['theme_mode'] = clean_text(row.get('ThemeMode'), 'Light')
+                                    st.session_state['theme_color'] = clean_text(row.get('ThemeColor'), 'Green (Default)')
+                                    st.session_state['ai_voice_style'] = clean_text(row.get('AIVoice'), 'Jarvis (US)')
+                                    st.session_state['onboarding_complete'] = True
+                                    st.toast(f"Welcome back, {name_input}!", icon="👋")
+                                    load_cloud_data()
+                                    time.sleep(1.0) 
                                     st.rerun()
+                                else:
+                                    st.error("Incorrect PIN.")
                             else:
                                 st.session_state['user_name'] = name_input
                                 st.session_state['temp_pin'] = pin_input
                                 st.session_state['onboarding_step'] = 2
+                                st.success("Username Available.")
+                                time.sleep(1.0)
                                 st.rerun()
                         except Exception as e:
                             st.error(f"Connection Error: {e}")
@@ -1444,21 +3108,20 @@ def page_onboarding():
                  st.session_state['user_type'] = role
                  st.session_state['user_goal'] = goal
                  try:
-                     from streamlit_gsheets import GSheetsConnection
-                     conn = st.connection("gsheets", type=GSheetsConnection)
-                     try: df = conn.read(worksheet="Sheet1", ttl=0)
-                     except: df = pd.DataFrame()
-                     
-                     new_user_data = pd.DataFrame([{
+                     # Backends write raw strings, so the PIN keeps its leading zeros
+                     get_user_backend().append_rows([{
                          "UserID": st.session_state['user_id'],
                          "Name": st.session_state['user_name'],
                          "XP": 0, "League": "Bronze",
                          "Avatar": st.session_state.get('user_avatar', "👤"),
                          "LastActive": datetime.date.today().strftime("%Y-%m-%d"),
-                         "PIN": "'" + str(st.session_state.get('temp_pin', "0000"))
+                         "PIN": str(st.session_state.get('temp_pin', "0000"))
+                     }])
+                     get_user_index_backend().upsert_rows([{
+                         "Name": str(st.session_state['user_name']).strip(),
+                         "UserID": st.session_state['user_id']
                      }])
-                     updated_df = new_user_data if df.empty else pd.concat([df, new_user_data], ignore_index=True)
-                     conn.update(worksheet="Sheet1", data=updated_df)
+                     get_leaderboard().update(st.session_state['user_id'], 0, name=st.session_state['user_name'], league="Bronze")
                      st.session_state['onboarding_complete'] = True
                      sync_data()
                      st.toast("Profile Created!")
@@ -1482,6 +3145,7 @@ def page_scheduler():
     # Ensure data integrity
     if 'timetable_slots' in st.session_state:
         for slot in st.session_state['timetable_slots']:
+            if 'id' not in slot: slot['id'] = str(uuid.uuid4())
             if 'Done' not in slot: slot['Done'] = False
             if 'XP' not in slot: slot['XP'] = 50
             if 'Difficulty' not in slot: slot['Difficulty'] = 'Medium'
@@ -1549,6 +3213,7 @@ def page_scheduler():
                 ist_now = datetime.datetime.utcnow() + datetime.timedelta(hours=5, minutes=30)
                 
                 new_task = {
+                    "id": str(uuid.uuid4()),
                     "Time": ist_now.strftime("%H:%M"),
                     "Activity": task_input,
                     "Category": cat_input,
@@ -1575,7 +3240,7 @@ def page_scheduler():
 
         # A. PENDING TASKS
         if pending:
-            for i, task in enumerate(st.session_state['timetable_slots']):
+            for task in st.session_state['timetable_slots']:
                 if not task['Done']:
                     d_color = "#B5FF5F" # Easy
                     if "Medium" in task['Difficulty']: d_color = "#FFD700" 
@@ -1587,8 +3252,9 @@ def page_scheduler():
                         c_chk, c_det, c_xp = st.columns([0.5, 6, 1.5], vertical_alignment="center")
                         
                         with c_chk:
-                            if st.button("⬜", key=f"btn_done_{i}", help="Mark as Done"):
-                                st.session_state['timetable_slots'][i]['Done'] = True
+                            if st.button("⬜", key=f"btn_done_{task['id']}", help="Mark as Done"):
+                                pos = find_task_position('timetable_slots', task['id'])
+                                st.session_state['timetable_slots'][pos]['Done'] = True
                                 sync_data()
                                 st.rerun()
                         
@@ -1636,6 +3302,7 @@ def page_scheduler():
                     st.session_state['xp_history'].append({"Date": today_str, "XP": final_xp})
                     
                     sync_data()
+                    save_user_xp()
                     st.balloons()
                     st.toast(f"Great work! Gained +{final_xp} XP", icon="🎉")
                     time.sleep(1.5)
@@ -1901,6 +3568,7 @@ def page_timer():
             today_str = datetime.date.today().strftime("%Y-%m-%d")
             st.session_state['xp_history'].append({"Date": today_str, "XP": possible_xp})
             sync_data()
+            save_user_xp()
             
             st.balloons()
             st.toast(f"Session Verified! +{possible_xp} XP Added.", icon="🛡️")
@@ -2007,6 +3675,7 @@ def page_calendar():
             
         if st.form_submit_button("Add Task", use_container_width=True):
             st.session_state['timetable_slots'].append({
+                "id": str(uuid.uuid4()),
                 "Date": sel_date, 
                 "Time": time_at.strftime("%H:%M"), 
                 "Activity": task, 
@@ -2021,44 +3690,24 @@ def page_calendar():
 
 # --- HELPER: Convert Local Image to HTML string for Buttons ---
 def get_custom_icon_html(file_path, width="28px"):
-    import base64
-    import os
-    if not os.path.exists(file_path):
+    icon_url = get_static_assets().url(file_path)
+    if not icon_url:
         return "🎤" # Fallback if image missing
-        
-    with open(file_path, "rb") as f:
-        data = base64.b64encode(f.read()).decode()
     # CSS styles to make it look like a clickable icon centered vertically
     return f"""
     <div style="display:flex; align-items:center; justify-content:center; height:100%;">
-        <img src="data:image/jpeg;base64,{data}" 
+        <img src="{icon_url}" 
         style="width:{width}; height:auto; border-radius:50%; cursor:pointer; transition:transform 0.1s;">
     </div>
     """
 
 # --- HELPER: Upload non-image files to Gemini API ---
 def upload_to_gemini_manager(uploaded_file_obj, api_key):
-    """Uploads PDFs/Videos to Gemini's temp storage API."""
+    """Uploads PDFs/Videos to Gemini's temp storage API (from memory, cached by content)."""
     try:
-        from google import genai
-        import tempfile
-        import os
-        
-        client = genai.Client(api_key=api_key)
-        
-        # 1. Save Streamlit uploaded file to a temporary local file
-        suffix = "." + uploaded_file_obj.name.split('.')[-1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-             tmp.write(uploaded_file_obj.getvalue())
-             tmp_path = tmp.name
-
-        # 2. Upload to Gemini endpoints
-        # print(f"Uploading {uploaded_file_obj.name} to Gemini...")
-        gemini_file = client.files.upload(path=tmp_path)
-        
-        # 3. Clean up local temp file
-        os.remove(tmp_path)
-        return gemini_file
+        mime_type = getattr(uploaded_file_obj, "type", None) or "application/octet-stream"
+        entry = get_gemini_files().get_or_upload(uploaded_file_obj.getvalue(), mime_type, [api_key])
+        return entry["file"]
     except Exception as e:
         st.error(f"File Upload Error: {e}")
         return None
@@ -2089,6 +3738,7 @@ def parse_and_add_ai_schedule(ai_response_text):
                 # Basic validation
                 if "Activity" in task and "Time" in task:
                     st.session_state['timetable_slots'].append({
+                        "id": str(uuid.uuid4()),
                         "Date": today_str,
                         "Time": task['Time'],
                         "Activity": task['Activity'],
@@ -2109,13 +3759,233 @@ def parse_and_add_ai_schedule(ai_response_text):
             
     return 0
 
+# --- HELPER: Cached text-to-speech ---
+TTS_CACHE_DIR = os.path.join(LOCAL_DATA_DIR, "tts")
+TTS_CACHE_MAX_BYTES = 200 * 1024 * 1024 # Least recently played clips are evicted past this
+TTS_CHUNK_CHARS = 300 # Sentences are grouped into chunks of about this size
+TTS_WORKERS = 2 # gTTS requests in flight per process; later chunks queue behind them
+TTS_POLL_SECONDS = 1.0 # While chunks are pending the player fragment checks for finished ones this often
+TTS_CHUNK_TIMEOUT = 60 # Seconds to wait for the next chunk in order before skipping it
+
+def gtts_synthesize(text, lang, tld):
+    """Default synthesizer: MP3 bytes from Google Translate TTS."""
+    import io
+    from gtts import gTTS
+    fp = io.BytesIO()
+    gTTS(text=text, lang=lang, tld=tld).write_to_fp(fp)
+    return fp.getvalue()
+
+def split_tts_chunks(text, max_chars=TTS_CHUNK_CHARS):
+    """Groups whole sentences into chunks, so the first one can play while the rest render."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if s.strip()]
+    chunks, current = [], ""
+    for sentence in sentences:
+        # Oversized sentences are wrapped on word boundaries
+        for piece in textwrap.wrap(sentence, max_chars) or [sentence]:
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+class TTSCache:
+    """
+    Size-bounded on-disk MP3 cache keyed by sha256(text, tld, lang).
+    A hit costs a file stat; a miss synthesizes once even if several
+    sessions ask at the same time. `synthesize(text, lang, tld) -> bytes`
+    is swappable (e.g. a stub in tests).
+    """
+    def __init__(self, root=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, synthesize=gtts_synthesize):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(text, tld, lang):
+        return hashlib.sha256(f"{lang}|{tld}|{text}".encode("utf-8")).hexdigest()
+
+    def get_path(self, text, tld="us", lang="en"):
+        """Path of the MP3 for this text/voice, synthesizing it on a miss."""
+        key = self.key(text, tld, lang)
+        path = os.path.join(self.root, f"{key}.mp3")
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if os.path.exists(path):
+                os.utime(path) # Recently played: survives eviction longer
+                return path
+            data = self.synthesize(text, lang, tld)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._key_locks.pop(key, None)
+            self._evict()
+        return path
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".mp3"):
+                full = os.path.join(self.root, name)
+                try:
+                    stat = os.stat(full)
+                    entries.append((stat.st_mtime, stat.st_size, full))
+                except OSError:
+                    pass
+        total = sum(size for _, size, _ in entries)
+        for _, size, full in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+                total -= size
+            except OSError:
+                pass
+
+@st.cache_resource(show_spinner=False)
+def get_tts_cache():
+    return TTSCache()
+
+@st.cache_resource(show_spinner=False)
+def get_tts_executor():
+    """Speech synthesis threads, separate from get_ai_executor so a long reply can't crowd out chat calls."""
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+VOICE_OPTIONS = {
+    "Jarvis (US)": {"tld": "us", "lang": "en", "desc": "Standard American (Professional)"},
+    "Friday (UK)": {"tld": "co.uk", "lang": "en", "desc": "British Accent (Sophisticated)"},
+    "Guru (Indian)": {"tld": "co.in", "lang": "en", "desc": "Indian Accent (Relatable)"},
+    "Mate (Australian)": {"tld": "com.au", "lang": "en", "desc": "Australian Accent (Relaxed)"},
+    "French (Elegant)": {"tld": "fr", "lang": "fr", "desc": "French Accent (Artistic)"}
+}
+VOICE_PREVIEW_DIR = os.path.join(LOCAL_DATA_DIR, "voice_previews")
+
+def voice_preview_text(voice):
+    voice_name = voice.split(" (")[0]
+    return f"Hello, I am {voice_name}. I am ready to assist you with your tasks."
+
+@st.cache_resource(show_spinner=False)
+def get_voice_preview_cache():
+    """Separate, never-evicted store: five fixed sentences, rendered once."""
+    return TTSCache(root=VOICE_PREVIEW_DIR, max_bytes=float("inf"))
+
+def prerender_voice_previews(cache=None):
+    """
+    Renders every voice's sample clip (skipping ones already on disk).
+    Runs on the first Settings visit; can also be run as a build step:
+        python -c "import timehunt_app; timehunt_app.prerender_voice_previews()"
+    Pass a TTSCache with a stub synthesizer to test without the network.
+    Returns {voice: mp3 path}.
+    """
+    cache = cache or get_voice_preview_cache()
+    return {
+        voice: cache.get_path(voice_preview_text(voice), opts["tld"], opts["lang"])
+        for voice, opts in VOICE_OPTIONS.items()
+    }
+
+@st.cache_resource(show_spinner=False)
+def warm_voice_previews():
+    """Starts prerendering in the background, once per process."""
+    return get_tts_executor().submit(prerender_voice_previews)
+
+def render_tts_player(text, tld, lang, player_key):
+    """
+    Plays `text` as a chain of cached sentence chunks served by Streamlit's
+    media endpoint (no inline data URIs). Every chunk is synthesized in the
+    background; a polling fragment adds each one to the queue as it finishes,
+    so the rest of the page never waits on gTTS. A chunk that fails or takes
+    longer than TTS_CHUNK_TIMEOUT is skipped and playback moves on.
+    """
+    chunks = split_tts_chunks(text)
+    if not chunks:
+        return
+    job = st.session_state.get('tts_job')
+    if not job or job["key"] != (player_key, text, tld, lang):
+        cache = get_tts_cache()
+        job = {
+            "key": (player_key, text, tld, lang),
+            "futures": [get_tts_executor().submit(cache.get_path, c, tld, lang) for c in chunks],
+            "parts": [], # ("audio", path) | ("skipped", reason), in chunk order
+            "waiting_since": time.time(), # When the next chunk in order became the one to wait for
+        }
+        st.session_state['tts_job'] = job
+
+    # Client side: when one chunk ends, start the next (waiting if it hasn't arrived yet)
+    components.html(f"""
+        <script>
+        const doc = window.parent.document;
+        let waiting = false;
+        function players() {{ return [...doc.querySelectorAll('.st-key-{player_key} audio')]; }}
+        function wire() {{
+            const list = players();
+            list.forEach((a, i) => {{
+                if (a.dataset.chained) return;
+                a.dataset.chained = "1";
+                a.addEventListener('ended', () => {{
+                    const next = players()[i + 1];
+                    if (next) next.play(); else waiting = true;
+                }});
+                if (waiting && i > 0) {{ waiting = false; a.play(); }}
+            }});
+        }}
+        setInterval(wire, 250);
+        </script>
+    """, height=0)
+
+    finished = len(job["parts"]) == len(job["futures"])
+    st.fragment(run_every=None if finished else TTS_POLL_SECONDS)(render_tts_chunks)(job, player_key)
+
+def collect_tts_chunks(job, now=None):
+    """Moves finished chunks, in order, from job["futures"] to job["parts"]; never blocks."""
+    now = time.time() if now is None else now
+    futures = job["futures"]
+    while len(job["parts"]) < len(futures):
+        future = futures[len(job["parts"])]
+        if future.done():
+            try:
+                job["parts"].append(("audio", future.result()))
+            except Exception as e:
+                job["parts"].append(("skipped", str(e) or type(e).__name__))
+        elif now - job["waiting_since"] > TTS_CHUNK_TIMEOUT:
+            future.cancel()
+            job["parts"].append(("skipped", f"timed out after {TTS_CHUNK_TIMEOUT}s"))
+        else:
+            break
+        job["waiting_since"] = now
+    return job["parts"]
+
+def render_tts_chunks(job, player_key):
+    """Fragment body: the players for every chunk collected so far (reruns on its own while chunks are pending)."""
+    parts = collect_tts_chunks(job)
+    with st.container(key=player_key):
+        players = 0
+        for kind, value in parts:
+            if kind == "audio":
+                st.audio(value, format="audio/mp3", autoplay=(players == 0))
+                players += 1
+        if not parts:
+            st.caption("🔊 Preparing audio...")
+    skipped = [value for kind, value in parts if kind == "skipped"]
+    if skipped:
+        st.caption(f"⚠️ Skipped {len(skipped)} part(s) of the audio ({skipped[-1]}).")
+
 # --- 10. PAGE: AI ASSISTANT (Gemini UI & Fixed Audio) ---
 def page_ai_assistant():
     from streamlit_mic_recorder import mic_recorder
     import uuid
     import base64
     import io
-    from gtts import gTTS
 
     # --- A. CSS: Round Logo, Hidden Audio & Buffering ---
     st.markdown("""
@@ -2160,10 +4030,12 @@ def page_ai_assistant():
 
     user_av = st.session_state.get('user_avatar', '👤')
     # Use your local image if available
-    ai_av = "1000592991.png" if os.path.exists("1000592991.png") else "🤖"
+    ai_av = media_path("1000592991.png", "avatar")
+    ai_av = ai_av if os.path.exists(ai_av) else "🤖"
 
     # --- C. Audio Toggle Logic ---
     def toggle_audio(index):
+        st.session_state.pop('tts_job', None) # Listen again = fresh player
         if st.session_state['audio_playing_index'] == index:
             st.session_state['audio_playing_index'] = None # Stop
         else:
@@ -2176,7 +4048,7 @@ def page_ai_assistant():
         return any(t in user_text.lower() for t in triggers)
 
     # --- E. PROCESS LOGIC ---
-    def process_message(prompt, file_data=None, file_type=None, audio_bytes=None, mode="Chat"):
+    def process_message(prompt, file_data=None, file_type=None, audio_bytes=None, mode="Chat", cache_context=None):
         if not prompt and not file_data and not audio_bytes: return
         
         # Init Session
@@ -2189,7 +4061,8 @@ def page_ai_assistant():
         if file_data: msg_data["file_type"] = file_type
         elif audio_bytes: msg_data["text"] = "🎤 [Voice]"
         
-        save_chat_to_cloud("user", msg_data.get("text", ""))
+        # Written before the (possibly long) generation so a rerun or closed tab can't lose it
+        append_chat_rows([build_chat_row("user", msg_data.get("text", ""))])
         st.session_state['chat_history'].append(msg_data)
 
         # AI Response
@@ -2210,27 +4083,39 @@ def page_ai_assistant():
             final_file_type = file_type if file_type else ("audio/wav" if audio_bytes else None)
             final_prompt = "Listen and reply." if audio_bytes else prompt
             use_search = (mode == "Web Search")
+            # Only canned prompts opt in to the shared reply cache; free-form chat depends on history
+            cache_args = {"cacheable": True, "cache_context": cache_context} if cache_context is not None else {}
 
             if mode == "Image Gen" or (prompt and check_if_image_request(prompt)):
-                img_data = generate_visual_intel(prompt)
+                asset_id = generate_visual_intel(prompt)
                 loading_ph.empty()
-                if img_data:
-                    st.image(base64.b64decode(img_data))
-                    save_chat_to_cloud("model", f"Visual: {prompt}", image_b64=img_data)
-                    st.session_state['chat_history'].append({"role": "model", "text": f"Generated: {prompt}", "image": img_data})
+                if asset_id:
+                    render_chat_image(asset_id, thumb=False)
+                    append_chat_rows([build_chat_row("model", f"Visual: {prompt}", image_ref=asset_id)])
+                    # Only the ID lives in session state; history renders the thumbnail
+                    st.session_state['chat_history'].append({"role": "model", "text": f"Generated: {prompt}", "image": asset_id})
             else:
                 # Call AI
-                response_text, _ = perform_ai_analysis(final_prompt, final_file_data, final_file_type, enable_search=use_search)
+                if AI_STREAMING:
+                    # Tokens replace the loading ring as soon as the first one arrives
+                    def chunks():
+                        for i, chunk in enumerate(stream_ai_analysis(final_prompt, final_file_data, final_file_type, enable_search=use_search, **cache_args)):
+                            if i == 0: loading_ph.empty()
+                            yield chunk
+                    response_text = st.write_stream(chunks())
+                    if not isinstance(response_text, str): response_text = "".join(map(str, response_text))
+                else:
+                    response_text, _ = perform_ai_analysis(final_prompt, final_file_data, final_file_type, enable_search=use_search, **cache_args)
                 
                 # Auto-Schedule Check
                 added = parse_and_add_ai_schedule(response_text)
                 if added > 0: response_text += f"\n\n(📅 Added {added} tasks to schedule)"
 
                 loading_ph.empty()
-                st.write(response_text)
+                if not AI_STREAMING: st.write(response_text)
                 
                 st.session_state['chat_history'].append({"role": "model", "text": response_text})
-                save_chat_to_cloud("model", response_text)
+                append_chat_rows([build_chat_row("model", response_text)])
             
             st.rerun()
 
@@ -2243,7 +4128,10 @@ def page_ai_assistant():
         st.caption("How can I help you achieve your goals today?")
         c1, c2 = st.columns(2)
         if c1.button("🎨 Create Image"): process_message("Generate a futuristic workspace", mode="Image Gen")
-        if c2.button("🧠 Analyze Schedule"): process_message("Analyze my current tasks and find gaps.")
+        if c2.button("🧠 Analyze Schedule"):
+            # Reusable until this user's tasks change
+            schedule_state = json.dumps([st.session_state.get('user_id'), st.session_state.get('timetable_slots', []), st.session_state.get('reminders', [])], default=str, sort_keys=True)
+            process_message("Analyze my current tasks and find gaps.", cache_context=schedule_state)
 
     # --- G. Render Chat History ---
     chat_container = st.container()
@@ -2275,37 +4163,17 @@ def page_ai_assistant():
                                 
                                 # 2. Voice Settings
                                 c_voice = st.session_state.get('ai_voice_style', 'Jarvis (US)')
-                                v_map = {
-                                    "Jarvis (US)": {"tld": "us", "lang": "en"},
-                                    "Friday (UK)": {"tld": "co.uk", "lang": "en"},
-                                    "Guru (Indian)": {"tld": "co.in", "lang": "en"},
-                                    "Mate (Australian)": {"tld": "com.au", "lang": "en"},
-                                    "French (Elegant)": {"tld": "fr", "lang": "fr"}
-                                }
-                                settings = v_map.get(c_voice, {"tld": "us", "lang": "en"})
-                                
-                                # 3. Generate Full Audio (NO LIMITS)
-                                tts = gTTS(text=clean_t, lang=settings['lang'], tld=settings['tld'])
-                                fp = io.BytesIO()
-                                tts.write_to_fp(fp)
-                                fp.seek(0)
-                                b64 = base64.b64encode(fp.read()).decode()
+                                settings = VOICE_OPTIONS.get(c_voice, VOICE_OPTIONS["Jarvis (US)"])
                                 
-                                # 4. Invisible HTML Player
-                                md = f"""
-                                    <audio autoplay="true" style="display:none;">
-                                    <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-                                    </audio>
-                                """
-                                st.markdown(md, unsafe_allow_html=True)
+                                # 3. Cached, chunked audio (hidden players, played in sequence)
+                                render_tts_player(clean_t, settings['tld'], settings['lang'], player_key=f"tts_player_{i}")
                                 
                             except Exception as e:
                                 st.error(f"Audio Error: {e}")
 
                 # Image Content
                 if msg.get('image'):
-                    try: st.image(base64.b64decode(msg['image']))
-                    except: pass
+                    render_chat_image(msg['image'])
 
     # --- H. Input Area ---
     st.write("---")
@@ -2473,38 +4341,52 @@ def create_mission_report(user_name, level, xp, history):
     
     return pdf.output(dest='S').encode('latin-1')
 
+def save_user_xp():
+    """Persists the session's XP total (queued), drops the cached profile and re-ranks the user."""
+    xp = max(0, int(st.session_state.get('user_xp', 0)))
+    update_user_setting("XP", xp)
+    try:
+        get_leaderboard().update(st.session_state.get('user_id'), xp, name=st.session_state.get('user_name'))
+    except Exception:
+        pass
+
 def refresh_user_data():
+    """
+    Pulls XP & settings for the current user.
+    Served from a per-user cache (PROFILE_CACHE_TTL); writes update it on submit
+    and invalidate it once they have been applied.
+    """
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        df = conn.read(worksheet="Sheet1", ttl=0) 
-        
         uid = str(st.session_state.get('user_id'))
+        cache = get_profile_cache()
+        row = cache.get(uid)
+        if row is None:
+            user_rows = get_user_backend().read_rows(uid)
+            row = user_rows[0] if user_rows else None
+            if row is not None:
+                cache.set(uid, row)
         
-        if not df.empty and 'UserID' in df.columns:
-            # Force string comparison
-            df['UserID'] = df['UserID'].astype(str)
-            user_row = df[df['UserID'] == uid]
+        if row is not None:
+            row = dict(row)
+            # Settings saved this session may still be in the write-behind queue
+            row.update(get_write_queue().pending_target(("Sheet1", uid)) or {})
             
-            if not user_row.empty:
-                row = user_row.iloc[0]
-                
-                # 1. XP (Keep existing logic)
-                try: new_xp = int(float(row['XP'])) 
-                except: new_xp = 0
-                st.session_state['user_xp'] = max(0, new_xp)
-                st.session_state['user_level'] = (new_xp // 1000) + 1
-
-                # 2. LOAD SETTINGS SAFELY (Using the clean_text tool)
-                # This prevents "nan" from appearing
-                focus_val = clean_text(row.get('MainFocus'), "Finish Tasks")
-                st.session_state['current_objective'] = focus_val
-                
-                theme_val = clean_text(row.get('ThemeMode'), "Light")
-                st.session_state['theme_mode'] = theme_val
-                
-                voice_val = clean_text(row.get('AIVoice'), "Jarvis (US)")
-                st.session_state['ai_voice_style'] = voice_val
+            # 1. XP (Keep existing logic)
+            try: new_xp = int(float(row['XP'])) 
+            except: new_xp = 0
+            st.session_state['user_xp'] = max(0, new_xp)
+            st.session_state['user_level'] = (new_xp // 1000) + 1
+
+            # 2. LOAD SETTINGS SAFELY (Using the clean_text tool)
+            # This prevents "nan" from appearing
+            focus_val = clean_text(row.get('MainFocus'), "Finish Tasks")
+            st.session_state['current_objective'] = focus_val
+            
+            theme_val = clean_text(row.get('ThemeMode'), "Light")
+            st.session_state['theme_mode'] = theme_val
+            
+            voice_val = clean_text(row.get('AIVoice'), "Jarvis (US)")
+            st.session_state['ai_voice_style'] = voice_val
 
     except Exception as e:
         pass 
@@ -2764,27 +4646,92 @@ def page_about():
     st.caption("🔒 System Status: ONLINE | 🛡️ Developed by TimeHunt Team | © 2026")
 
 # --- 15. LEADERBOARD UTILITY ---
+class Leaderboard:
+    """
+    Process-wide ranking of all users by XP.
+    Keeps a sorted index of (-XP, UserID), so XP changes are applied in place
+    and both the top K and any user's rank are a slice / binary search away.
+    Sheet1 is re-read only every LEADERBOARD_REFRESH seconds, with queued
+    (not yet written) changes overlaid.
+    """
+    def __init__(self, refresh=LEADERBOARD_REFRESH):
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._order = []  # Sorted [(-xp, uid)]
+        self._xp = {}     # uid -> xp
+        self._info = {}   # uid -> {"Name", "League"}
+        self._loaded_at = 0
+
+    @staticmethod
+    def _parse_xp(value):
+        try: return int(float(value or 0))
+        except (TypeError, ValueError): return 0
+
+    def _reload_if_stale(self):
+        if time.time() - self._loaded_at < self.refresh:
+            return
+        rows = get_user_backend().read_all()
+        queue = get_write_queue()
+        xp, info = {}, {}
+        for row in rows:
+            uid = str(row.get("UserID", ""))
+            if uid:
+                # XP awards still in the write-behind queue aren't in Sheet1 yet
+                pending = queue.pending_target(("Sheet1", uid))
+                if pending:
+                    row = {**row, **pending}
+                xp[uid] = self._parse_xp(row.get("XP"))
+                info[uid] = {"Name": row.get("Name", ""), "League": row.get("League", "")}
+        self._xp, self._info = xp, info
+        self._order = sorted((-v, uid) for uid, v in xp.items())
+        self._loaded_at = time.time()
+
+    def update(self, uid, xp, name=None, league=None):
+        """Moves one user to their new position (O(log n) search, no re-sort)."""
+        uid, xp = str(uid), self._parse_xp(xp)
+        with self._lock:
+            old = self._xp.get(uid)
+            if old is not None:
+                pos = bisect.bisect_left(self._order, (-old, uid))
+                if pos < len(self._order) and self._order[pos] == (-old, uid):
+                    self._order.pop(pos)
+            bisect.insort(self._order, (-xp, uid))
+            self._xp[uid] = xp
+
+            info = self._info.setdefault(uid, {"Name": "", "League": ""})
+            if name is not None: info["Name"] = name
+            if league is not None: info["League"] = league
+
+    def top(self, k=10):
+        with self._lock:
+            self._reload_if_stale()
+            return [
+                {"Rank": i + 1, "UserID": uid, "XP": -neg_xp, **self._info.get(uid, {})}
+                for i, (neg_xp, uid) in enumerate(self._order[:k])
+            ]
+
+    def rank(self, uid):
+        """(rank, total users) for one user, or (None, total) if unknown."""
+        uid = str(uid)
+        with self._lock:
+            self._reload_if_stale()
+            if uid not in self._xp:
+                return None, len(self._order)
+            return bisect.bisect_left(self._order, (-self._xp[uid], uid)) + 1, len(self._order)
+
+@st.cache_resource(show_spinner=False)
+def get_leaderboard():
+    return Leaderboard()
+
 def fetch_leaderboard_data():
     """
-    Fetches user data from 'Sheet1', sorts by XP, and returns the top 10.
+    Returns the top 10 users by XP from the shared leaderboard.
     """
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        df = conn.read(worksheet="Sheet1", ttl=0) 
-        
-        if not df.empty and 'XP' in df.columns:
-            # Clean and Sort Data
-            df['XP'] = pd.to_numeric(df['XP'], errors='coerce').fillna(0)
-            df = df.sort_values(by='XP', ascending=False).reset_index(drop=True)
-            
-            # Assign Rank
-            df['Rank'] = df.index + 1
-            return df.head(10)
+        return pd.DataFrame(get_leaderboard().top(10), columns=["Rank", "UserID", "Name", "League", "XP"])
     except Exception:
         # Fail silently if offline
         return pd.DataFrame()
-    return pd.DataFrame()
 
 # --- 16. PAGE: DASHBOARD (Analytics) ---
 def page_dashboard():
@@ -2962,12 +4909,13 @@ def page_dashboard():
             }
         )
         
-        # Highlight User Rank
-        my_id = str(st.session_state.get('user_id'))
-        my_rank_row = leader_df[leader_df['UserID'].astype(str) == my_id]
-        if not my_rank_row.empty:
-            rank_num = my_rank_row.iloc[0]['Rank']
-            st.info(f"📍 You are currently **Rank #{rank_num}** in the global league.")
+        # Highlight User Rank (works outside the top 10 too)
+        try:
+            rank_num, total_users = get_leaderboard().rank(st.session_state.get('user_id'))
+        except Exception:
+            rank_num = None
+        if rank_num:
+            st.info(f"📍 You are currently **Rank #{rank_num}** of {total_users} in the global league.")
     else:
         st.warning("Leaderboard is currently syncing. Please wait.")
 
@@ -3036,13 +4984,8 @@ def page_settings():
     # Default to 'Jarvis' if not set
     current_voice = st.session_state.get('ai_voice_style', 'Jarvis (US)')
     
-    voice_options = {
-        "Jarvis (US)": {"tld": "us", "lang": "en", "desc": "Standard American (Professional)"},
-        "Friday (UK)": {"tld": "co.uk", "lang": "en", "desc": "British Accent (Sophisticated)"},
-        "Guru (Indian)": {"tld": "co.in", "lang": "en", "desc": "Indian Accent (Relatable)"},
-        "Mate (Australian)": {"tld": "com.au", "lang": "en", "desc": "Australian Accent (Relaxed)"},
-        "French (Elegant)": {"tld": "fr", "lang": "fr", "desc": "French Accent (Artistic)"}
-    }
+    voice_options = VOICE_OPTIONS
+    warm_voice_previews() # Samples render in the background so Preview plays instantly
     
     # Create list for selectbox
     voice_list = list(voice_options.keys())
@@ -3062,22 +5005,12 @@ def page_settings():
     if st.button("🔊 Listen to Preview", type="secondary"):
         with st.spinner("Generating voice sample..."):
             try:
-                from gtts import gTTS
-                import io
                 target_tld = voice_options[selected_voice]['tld']
                 target_lang = voice_options[selected_voice]['lang']
 
-                voice_name = selected_voice.split(" (")[0]
-                sample_text = f"Hello, I am {voice_name}. I am ready to assist you with your tasks."
-                
-                
-                tts = gTTS(text=sample_text, lang=target_lang, tld=target_tld, slow=False)
-                audio_fp = io.BytesIO()
-                tts.write_to_fp(audio_fp)
-                audio_fp.seek(0)
-                
-                
-                st.audio(audio_fp, format='audio/mp3')
+                # Pre-rendered clip (rendered now only if warm-up hasn't reached it yet)
+                sample_path = get_voice_preview_cache().get_path(voice_preview_text(selected_voice), target_tld, target_lang)
+                st.audio(sample_path, format='audio/mp3')
                 
             except Exception as e:
                 st.error(f"Could not generate preview. Error: {e}")
@@ -3106,6 +5039,7 @@ def page_settings():
     with st.expander("Reset Options"):
         st.warning("Factory Reset will remove all local data and log you out. Cloud data may persist.")
         if st.button("🔥 Factory Reset App", type="secondary"):
+        	flush_pending_writes()
         	for key in list(st.session_state.keys()):
         		del st.session_state[key]
         		st.cache_data.clear()
@@ -3124,18 +5058,17 @@ def render_alarm_ui():
         # Get Alarm Details
         alarm_data = st.session_state['active_alarm']
         task_name = alarm_data['task']
-        idx = alarm_data['index']
+        idx = find_task_position('reminders', alarm_data.get('id'))
+        if idx is None:
+            # Reminder was removed elsewhere (e.g. another tab synced)
+            st.session_state['active_alarm'] = None
+            return
         
         # 1. Audio Logic (Looping)
         # Tries to play a custom file, falls back to a standard web beep
-        sound_file = "alarm.mp3"
-        if os.path.exists(sound_file):
-            try:
-                with open(sound_file, "rb") as f:
-                    audio_bytes = f.read()
-                b64 = base64.b64encode(audio_bytes).decode()
-                st.markdown(f'<audio src="data:audio/mp3;base64,{b64}" autoplay loop></audio>', unsafe_allow_html=True)
-            except: pass
+        sound_url = get_static_assets().url("alarm.mp3", mime_type="audio/mpeg")
+        if sound_url:
+            st.markdown(f'<audio src="{sound_url}" autoplay loop></audio>', unsafe_allow_html=True)
         else:
             # Standard Beep
             st.markdown('<audio src="https://www.soundjay.com/buttons/beep-01a.mp3" autoplay loop></audio>', unsafe_allow_html=True)
@@ -3234,8 +5167,7 @@ def page_help():
     # 1. STATUS INDICATOR (The "Pro" Touch)
     # Checks if we are connected to the cloud effectively
     try:
-        from streamlit_gsheets import GSheetsConnection
-        conn = st.connection("gsheets", type=GSheetsConnection)
+        get_user_backend()
         status_color = "#B5FF5F" # Green
         status_text = "ALL SYSTEMS OPERATIONAL"
     except:
@@ -3249,6 +5181,16 @@ def page_help():
     </div>
     """, unsafe_allow_html=True)
 
+    # AI latency (process-wide, recent requests)
+    ttft = get_ai_metrics().summary("ttft")
+    if ttft and ttft["p50"] is not None:
+        st.caption(f"⚡ AI time-to-first-token: p50 {ttft['p50']:.1f}s · p95 {ttft['p95']:.1f}s ({ttft['count']} replies)")
+    for provider, label in (("hf", "Hugging Face"), ("pollinations", "Pollinations")):
+        img_stats = get_ai_metrics().summary(f"image:{provider}")
+        if img_stats:
+            p50 = f"p50 {img_stats['p50']:.1f}s · " if img_stats['p50'] is not None else ""
+            st.caption(f"🎨 {label}: {p50}{img_stats['count']} ok / {img_stats['failed']} failed")
+
     # 2. TABBED LAYOUT (Cleaner UX)
     tab_guide, tab_faq, tab_ticket = st.tabs(["📲 Installation", "📘 Knowledge Base", "📬 Support Ticket"])
 
@@ -3392,7 +5334,8 @@ def page_study_zone():
                         {{"q": "Next question?", "a": "Next answer"}}
                     ]
                     """
-                    response, _ = perform_ai_analysis(prompt)
+                    # Same topic + difficulty -> same cards for everyone
+                    response, _ = perform_ai_analysis(prompt, cacheable=True)
                     
                     try:
                         # Clean up code blocks if Gemini adds them
@@ -3404,6 +5347,8 @@ def page_study_zone():
                         st.session_state['show_answer'] = False
                         st.rerun()
                     except:
+                        # Don't keep serving a reply that failed to parse
+                        get_ai_response_cache().invalidate(ai_cache_key(prompt))
                         st.error("AI returned invalid data. Please try again.")
             else:
                 st.warning("Please enter a topic.")
@@ -3456,6 +5401,7 @@ def page_study_zone():
                         st.balloons()
                         st.toast("Session Complete! +50 XP")
                         st.session_state['user_xp'] += 50
+                        save_user_xp()
                         st.session_state['flashcards'] = [] # Reset
                     st.rerun()
             else:
@@ -3523,6 +5469,15 @@ def page_eisenhower():
 
 # --- 20. MAIN APPLICATION ROUTER ---
 def main():
+    # 0. Splash first, so it covers this run's real startup work instead of a fixed wait
+    splash_shown = show_comet_splash()
+    try:
+        route_app()
+    finally:
+        if splash_shown:
+            end_comet_splash()
+
+def route_app():
     # 1. Initialize System State
     initialize_session_state()
     
@@ -3530,9 +5485,8 @@ def main():
     check_reminders()
     render_alarm_ui()
 
-    # 3. Load Styles & Splash
+    # 3. Load Styles
     inject_custom_css()
-    show_comet_splash()
 
     # 4. Onboarding Gate
     if not st.session_state['onboarding_complete']:
@@ -3616,6 +5570,8 @@ def main():
                 music_mode = st.selectbox("Soundscape", ["Om Chanting", "Binaural Beats", "Flute Flow", "Rainfall"], label_visibility="collapsed")
                 local_map = {"Om Chanting": "om.mp3", "Binaural Beats": "binaural.mp3", "Flute Flow": "flute.mp3", "Rainfall": "rain.mp3"}
                 target_file = local_map.get(music_mode)
+                if target_file:
+                    target_file = media_path(target_file, "loop")
                 
                 if target_file and os.path.exists(target_file):
                     st.audio(target_file, format="audio/mp3", loop=True)
@@ -3650,6 +5606,7 @@ def main():
                 }
             )
             st.caption(f"👤 **{st.session_state.get('user_name', 'User')}**")
+            render_sync_status()
 
         if nav == "Home": page_home()
         elif nav == "Scheduler": page_scheduler()